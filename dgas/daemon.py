@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import NewType, Union, List, Tuple, Sequence, Callable, Any
 
+import numpy as np
 import matplotlib.animation as anm
 
 from dgas import rc, node, message, graph, time, plot
@@ -11,28 +12,32 @@ class FairDaemon:
     def __init__(self, g: graph.GraphType):
         self.graph = g
 
-    def choose(self) -> Tuple[List[node.Node], List[message.Message]]:
-        return self.graph.nodes(), self.graph.messages()
-
     def update_nodes(self, t: rc.GlobalTime, nodelist: Sequence[node.Node] = None):
         for node in nodelist or self.graph.nodes():
             if not node.clashed:
                 node.update(t)
 
     def update_messages(self, t: rc.GlobalTime, messagelist: Sequence[message.Message] = None):
-        for message in messagelist or self.graph.messages():
-            message.update(t)
-        arrive = {nod: {msg for msg in msgs if msg.arrive()}
-                  for (nod, msgs) in self.graph.sendings.items()}
-        for nod, arrived in arrive.items():
-            self.graph.remove_messages_from_node(nod, arrived)
-            for msg in arrived:
-                msg.to_node.receive(msg.from_node, msg.raw)
+        '''
+        deliver messages whose arrival frame is t or before, popped from calendar queue of the graph.
+        O(arrivals), not O(messages in flight). if messagelist is given, only arrived ones of them
+        are delivered, and the others stay in flight until they are given or no list is given.
+        '''
+        table = self.graph.messagetable
+        if messagelist:
+            rows = np.array(list(dict.fromkeys(msg.row for msg in messagelist
+                                               if msg.alive() and msg.arrive(t))), dtype=np.int64)
+        else:
+            rows = table.pop_arrivals(t)
+        arrived = table.gather(rows)
+        table.remove(rows)
+        for from_node, to_node, raw in arrived:
+            to_node.receive(from_node, raw)
 
     def each_loop(self, t: rc.GlobalTime):
-        nodes, messages = self.choose()
-        self.update_nodes(t, nodes)
-        self.update_messages(t, messages)
+        self.graph.frame = t
+        self.update_nodes(t, self.graph.nodes())
+        self.update_messages(t)
 
     def main_loop(self, untiltime: rc.GlobalTime = None, timeout: rc.GlobalTime = None,
                   condition: Callable[[Any], bool] = lambda x: False,
@@ -66,5 +71,8 @@ class ManetDaemon(FairDaemon):
         self.field.update(t)
         return super().each_loop(t)
 
-    def animate(self, **kwargs) -> anm.ArtistAnimation:
-        plot.artistanimate_manet_daemon(self, **kwargs)
+    def animate(self, path: str, **kwargs) -> int:
+        '''
+        simulate with frames written to path (plot.stream_manet_daemon).
+        '''
+        return plot.stream_manet_daemon(self, path, **kwargs)
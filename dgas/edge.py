@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Union, List, Set
+from typing import Union, List, Set, Dict
 
 import torch
 
@@ -7,9 +7,26 @@ from dgas import rc, graph, node, message, plot
 
 
 class EdgeData:
+    __slots__ = ('drawable_stack', 'weight')
+
     def __init__(self, weight=None, drawable: plot.DrawableEdge = None):
-        self.drawable_stack = [drawable or plot.DrawableEdge()]
+        self.drawable_stack = [drawable]    # None is replaced by default drawable when drawn
         self.weight = weight or rc.edge_weight
 
     def drawable(self) -> plot.DrawableEdge:
+        if self.drawable_stack[-1] is None:
+            self.drawable_stack[-1] = plot.DrawableEdge()
         return self.drawable_stack[-1]
+
+
+_flyweights: Dict[rc.Number, EdgeData] = {}
+
+
+def flyweight(weight=None) -> EdgeData:
+    '''
+    EdgeData of the weight shared by all edges in headless mode, so never modify it.
+    '''
+    weight = weight or rc.edge_weight
+    if weight not in _flyweights:
+        _flyweights[weight] = EdgeData(weight)
+    return _flyweights[weight]
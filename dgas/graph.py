@@ -1,13 +1,29 @@
 from __future__ import annotations
-from typing import Union, Tuple, Iterable, Type, Dict, List, Set, NewType, Sequence
+from typing import Union, Tuple, Iterable, Type, Dict, List, Set, NewType, Sequence, Any
 
+import numpy as np
 import networkx as nx
 
-from dgas import rc, node, edge, message, result
+from dgas import rc, node, edge, message, plot, result
+
+
+class _Missing:
+    '''
+    value of attribute columns where the attribute is not set, since None can be set.
+    '''
+
+    def __repr__(self) -> str:
+        return '<missing>'
+
+    def __reduce__(self) -> str:
+        return '_MISSING'   # the same instance after pickle
+
+
+_MISSING = _Missing()
 
 
 def make_graph(graphtype: Union[str, nx.Graph, nx.DiGraph, nx.MultiGraph, nx.MultiDiGraph] = nx.Graph,
-               messages: Dict[node.Node, Set[message.Message]] = None) -> GraphType:
+               messages: message.MessageTable = None) -> GraphType:
     if (graphtype == rc.undirected_graph) or (graphtype == nx.Graph):
         return UndirectedGraph(messages)
     elif (graphtype == rc.directed_graph) or (graphtype == nx.DiGraph):
@@ -16,65 +32,376 @@ def make_graph(graphtype: Union[str, nx.Graph, nx.DiGraph, nx.MultiGraph, nx.Mul
         return UndirectedMultiGraph(messages)
     elif (graphtype == rc.directed_multigraph) or (graphtype == nx.MultiDiGraph):
         return DirectedMultiGraph(messages)
+    elif graphtype == rc.undirected_csr_graph:
+        return UndirectedCsrGraph(messages)
     else:
         raise ValueError(f'unresolved graph type {graphtype}.')
 
 
 class GraphWithMessage():
-    def __init__(self, messages: Dict[node.Node, Set[message.Message]] = None):
-        self.sendings = messages or {}
+    '''
+    messages in flight are rows of message.MessageTable,
+    and message.Message views are created only by messages() and get_sending().
+    '''
+
+    def __init__(self, messages: message.MessageTable = None):
+        self.messagetable = message.MessageTable() if messages is None else messages
+        self.frame: rc.GlobalTime = 0
 
     def messages(self) -> List[message.Message]:
-        return [msg for msgs in self.sendings.values() for msg in msgs]
+        table = self.messagetable
+        return [table.view(row) for row in table.rows().tolist()]
 
     def get_sending(self, from_node: node.Node) -> Set[message.Message]:
-        return self.sendings.get(from_node, set())
+        table = self.messagetable
+        return {table.view(row) for row in table.rows(from_node).tolist()}
 
-    def add_message(self, from_node: node.Node, msg: message.Message):
-        self.sendings[from_node] = self.sendings.get(from_node, set()) | {msg}
+    def add_message(self, from_node: node.Node, to_node: node.Node, msg: rc.MessageType,
+                    edgedata: edge.EdgeData, drawable: plot.DrawableMessage = None) -> int:
+        '''
+        amortized O(1), message is sended at current frame. return the row of message table.
+        '''
+        return self.messagetable.append(from_node, to_node, msg, edgedata, drawable, self.frame)
 
-    def extend_messages(self, from_node: node.Node, msgs: Iterable[message.Message]):
-        self.sendings[from_node] = self.sendings.get(
-            from_node, set()) | {*msgs}
+    def extend_messages(self, from_node: node.Node,
+                        msgs: Iterable[Tuple[node.Node, rc.MessageType, edge.EdgeData]],
+                        drawable: plot.DrawableMessage = None) -> List[int]:
+        return [self.add_message(from_node, to_node, msg, edgedata, drawable)
+                for to_node, msg, edgedata in msgs]
 
     def remove_message(self, from_node: node.Node, msg: message.Message):
-        node_sending = self.sendings.get(from_node)
-        if node_sending:
-            node_sending -= {msg}
-        if not node_sending:
-            self.sendings.pop(from_node, None)
+        self.remove_messages_from_node(from_node, [msg])
 
     def remove_messages_from_node(self, from_node: node.Node, msgs: Iterable[message.Message]):
-        node_sending = self.sendings.get(from_node)
-        if node_sending:
-            node_sending -= {*msgs}
-        if not node_sending:
-            self.sendings.pop(from_node, None)
+        self.messagetable.remove([msg.row for msg in msgs
+                                  if msg.alive() and msg.from_node is from_node])
 
 
 class UndirectedGraph(GraphWithMessage, nx.Graph):
-    def __init__(self, messages: Dict[node.Node, Set[message.Message]] = None):
+    def __init__(self, messages: message.MessageTable = None):
         GraphWithMessage.__init__(self, messages)
         nx.Graph.__init__(self)
 
 
 class DirectedGraph(GraphWithMessage, nx.DiGraph):
-    def __init__(self, messages: Dict[node.Node, Set[message.Message]] = None):
+    def __init__(self, messages: message.MessageTable = None):
         GraphWithMessage.__init__(self, messages)
         nx.DiGraph.__init__(self)
 
 
 class UndirectedMultiGraph(GraphWithMessage, nx.MultiGraph):
-    def __init__(self, messages: Dict[node.Node, Set[message.Message]] = None):
+    def __init__(self, messages: message.MessageTable = None):
         GraphWithMessage.__init__(self, messages)
         nx.MultiGraph.__init__(self)
 
 
 class DirectedMultiGraph(GraphWithMessage, nx.MultiDiGraph):
-    def __init__(self, messages: Dict[node.Node, Set[message.Message]] = None):
+    def __init__(self, messages: message.MessageTable = None):
         GraphWithMessage.__init__(self, messages)
         nx.MultiDiGraph.__init__(self)
 
 
-GraphType = NewType('GraphType', Union[UndirectedGraph,
-                                       DirectedGraph, UndirectedMultiGraph, DirectedMultiGraph])
+class UndirectedCsrGraph(GraphWithMessage):
+    '''
+    array-backed undirected graph. nodes are integer indices in insertion order,
+    edges are sorted keys (u << 32 | v, u < v) with attribute columns,
+    and adjacency is CSR rebuilt lazily after edges change.
+    it has the subset of networkx.Graph interface used by nodes, fields and daemons,
+    and networkx graph is built only on demand by to_networkx() for plotting and analytics.
+    '''
+
+    def __init__(self, messages: message.MessageTable = None):
+        GraphWithMessage.__init__(self, messages)
+        self.nodelist: List[node.Node] = []
+        self._index: Dict[node.Node, int] = {}
+        self._node_columns: Dict[str, List] = {}
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._edge_columns: Dict[str, np.ndarray] = {}
+        self._indptr: np.ndarray = None
+        self._indices: np.ndarray = None
+        self._slots: np.ndarray = None
+        self._networkx: nx.Graph = None
+        self.edges = CsrEdgeView(self)
+        self.degree = CsrDegreeView(self)
+
+    def __len__(self) -> int:
+        return len(self.nodelist)
+
+    def __iter__(self) -> Iterable[node.Node]:
+        return iter(self.nodelist)
+
+    def __contains__(self, n: node.Node) -> bool:
+        return n in self._index
+
+    def __getitem__(self, u: node.Node) -> CsrAdjacencyView:
+        return CsrAdjacencyView(self, self._index[u])
+
+    def is_directed(self) -> bool:
+        return False
+
+    def is_multigraph(self) -> bool:
+        return False
+
+    def index(self, n: node.Node) -> int:
+        return self._index[n]
+
+    def number_of_nodes(self) -> int:
+        return len(self.nodelist)
+
+    def number_of_edges(self) -> int:
+        return len(self._keys)
+
+    def nodes(self, data: Union[str, bool] = False, default=None) -> List:
+        if data is False:
+            return list(self.nodelist)
+        elif data is True:
+            return [(n, {k: c[i] for k, c in self._node_columns.items() if c[i] is not _MISSING})
+                    for i, n in enumerate(self.nodelist)]
+        else:
+            column = self._node_columns.get(data, [_MISSING] * len(self.nodelist))
+            return [(n, default if v is _MISSING else v) for n, v in zip(self.nodelist, column)]
+
+    def add_node(self, n: node.Node, **attr):
+        self.add_nodes_from([(n, attr)])
+
+    def add_nodes_from(self, nodes: Iterable[Union[node.Node, Tuple[node.Node, Dict[str, Any]]]], **attr):
+        for item in nodes:
+            n, data = item if isinstance(item, tuple) else (item, {})
+            if n not in self._index:
+                self._index[n] = len(self.nodelist)
+                self.nodelist.append(n)
+                for column in self._node_columns.values():
+                    column.append(_MISSING)
+            i = self._index[n]
+            for k, v in {**attr, **data}.items():
+                self._node_columns.setdefault(k, [_MISSING] * len(self.nodelist))[i] = v
+        self._changed()
+
+    def neighbors(self, n: node.Node) -> Iterable[node.Node]:
+        indptr, indices, _slots = self.csr()
+        i = self._index[n]
+        return map(self.nodelist.__getitem__, indices[indptr[i]:indptr[i+1]].tolist())
+
+    def has_edge(self, u: node.Node, v: node.Node) -> bool:
+        return u in self._index and v in self._index and \
+            self._slot(self._index[u], self._index[v]) is not None
+
+    def add_edge(self, u: node.Node, v: node.Node, **attr):
+        self.add_edges_from([(u, v, attr)])
+
+    def add_edges_from(self, ebunch: Iterable[Tuple], **attr):
+        ebunch = list(ebunch)
+        self.add_nodes_from(n for e in ebunch for n in e[:2] if n not in self._index)
+        columns = {k: [] for e in ebunch if len(e) > 2 for k in e[2]}
+        columns.update({k: [] for k in attr})
+        for e in ebunch:
+            data = {**attr, **e[2]} if len(e) > 2 else attr
+            for k, column in columns.items():
+                column.append(data.get(k, _MISSING))
+        self.add_index_edges([self._index[e[0]] for e in ebunch],
+                             [self._index[e[1]] for e in ebunch], columns)
+
+    def remove_edges_from(self, ebunch: Iterable[Tuple]):
+        ebunch = [e for e in ebunch if e[0] in self._index and e[1] in self._index]
+        self.remove_index_edges([self._index[e[0]] for e in ebunch],
+                                [self._index[e[1]] for e in ebunch])
+
+    def add_index_edges(self, u: Sequence[int], v: Sequence[int], columns: Dict[str, Sequence] = None):
+        '''
+        add edges by node index, vectorized. existing edges get the new attributes.
+        O(E + k log k) by numpy.
+        '''
+        keys = _edge_keys(u, v)
+        if len(keys) == 0:
+            return
+        _keys, first = np.unique(keys[::-1], return_index=True)
+        last = len(keys) - 1 - first    # the latter one wins, like networkx
+        keys = keys[last]
+        columns = {k: _object_array(c)[last] for k, c in (columns or {}).items()}
+        for k in columns:
+            if k not in self._edge_columns:
+                self._edge_columns[k] = np.full(len(self._keys), _MISSING, dtype=object)
+        exist = np.isin(keys, self._keys)
+        if exist.any():
+            at = np.searchsorted(self._keys, keys[exist])
+            for k, c in columns.items():
+                self._edge_columns[k][at] = c[exist]
+        new = ~exist
+        merged = np.concatenate((self._keys, keys[new]))
+        order = np.argsort(merged, kind='stable')
+        self._keys = merged[order]
+        for k, c in self._edge_columns.items():
+            added = columns[k][new] if k in columns else np.full(new.sum(), _MISSING, dtype=object)
+            self._edge_columns[k] = np.concatenate((c, added))[order]
+        self._changed()
+
+    def remove_index_edges(self, u: Sequence[int], v: Sequence[int]):
+        '''
+        remove edges by node index, vectorized. non-existent edges are ignored.
+        '''
+        keys = _edge_keys(u, v)
+        if len(keys) == 0:
+            return
+        keep = ~np.isin(self._keys, keys)
+        self._keys = self._keys[keep]
+        for k, c in self._edge_columns.items():
+            self._edge_columns[k] = c[keep]
+        self._changed()
+
+    def edge_index(self) -> np.ndarray:
+        '''
+        pairs of node index (E*2), sorted lexicographically and pairs[k, 0] < pairs[k, 1].
+        '''
+        return np.stack((self._keys >> 32, self._keys & 0xFFFFFFFF), axis=1)
+
+    def edge_column(self, key: str, default=None) -> np.ndarray:
+        '''
+        values of attribute key of edges in order of edge_index(), default where it is not set.
+        '''
+        column = self._edge_columns.get(key, [_MISSING] * len(self._keys))
+        return _object_array([default if d is _MISSING else d for d in column])
+
+    def csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        (indptr, indices, slots). neighbors of node i are indices[indptr[i]:indptr[i+1]]
+        sorted by index, and slots are positions of the edges in the attribute columns.
+        '''
+        if self._indptr is None:
+            n, m = len(self.nodelist), len(self._keys)
+            u, v = self._keys >> 32, self._keys & 0xFFFFFFFF
+            src, dst = np.concatenate((u, v)), np.concatenate((v, u))
+            slots = np.concatenate((np.arange(m), np.arange(m)))
+            order = np.lexsort((dst, src))
+            self._indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=n), out=self._indptr[1:])
+            self._indices, self._slots = dst[order], slots[order]
+        return self._indptr, self._indices, self._slots
+
+    def to_networkx(self) -> nx.Graph:
+        '''
+        networkx view of this graph, cached until this graph changes.
+        nodes and edge attribute values are the same instances.
+        '''
+        if self._networkx is None:
+            g = nx.Graph()
+            g.add_nodes_from(self.nodes(data=True))
+            names = list(self._edge_columns)
+            g.add_edges_from((self.nodelist[u], self.nodelist[v],
+                              {k: self._edge_columns[k][i] for k in names
+                               if self._edge_columns[k][i] is not _MISSING})
+                             for i, (u, v) in enumerate(self.edge_index().tolist()))
+            self._networkx = g
+        return self._networkx
+
+    def _slot(self, u: int, v: int) -> Union[int, None]:
+        key = (min(u, v) << 32) | max(u, v)
+        at = int(np.searchsorted(self._keys, key))
+        return at if at < len(self._keys) and self._keys[at] == key else None
+
+    def _changed(self):
+        self._indptr = self._indices = self._slots = None
+        self._networkx = None
+
+
+class CsrAdjacencyView:
+    def __init__(self, g: UndirectedCsrGraph, u: int):
+        self._graph = g
+        self._u = u
+
+    def __getitem__(self, v: node.Node) -> CsrEdgeAttributes:
+        slot = self._graph._slot(self._u, self._graph.index(v))
+        if slot is None:
+            raise KeyError(v)
+        return CsrEdgeAttributes(self._graph, slot)
+
+    def __contains__(self, v: node.Node) -> bool:
+        return v in self._graph and self._graph._slot(self._u, self._graph.index(v)) is not None
+
+    def __iter__(self) -> Iterable[node.Node]:
+        return self._graph.neighbors(self._graph.nodelist[self._u])
+
+    def __len__(self) -> int:
+        return self._graph.degree[self._graph.nodelist[self._u]]
+
+
+class CsrEdgeAttributes:
+    def __init__(self, g: UndirectedCsrGraph, slot: int):
+        self._graph = g
+        self._slot = slot
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        columns = self._graph._edge_columns
+        if key not in columns:
+            columns[key] = np.full(len(self._graph._keys), _MISSING, dtype=object)
+        columns[key][self._slot] = value
+        self._graph._networkx = None
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key: str, default=None) -> Any:
+        column = self._graph._edge_columns.get(key)
+        value = _MISSING if column is None else column[self._slot]
+        return default if value is _MISSING else value
+
+
+class CsrEdgeView:
+    def __init__(self, g: UndirectedCsrGraph):
+        self._graph = g
+
+    def __call__(self) -> List[Tuple[node.Node, node.Node]]:
+        nodelist = self._graph.nodelist
+        return [(nodelist[u], nodelist[v]) for u, v in self._graph.edge_index().tolist()]
+
+    def __iter__(self) -> Iterable[Tuple[node.Node, node.Node]]:
+        return iter(self())
+
+    def __len__(self) -> int:
+        return self._graph.number_of_edges()
+
+    def __getitem__(self, e: Tuple[node.Node, node.Node]) -> CsrEdgeAttributes:
+        return self._graph[e[0]][e[1]]
+
+    def data(self, key: str, default=None) -> List[Tuple[node.Node, node.Node, Any]]:
+        nodelist = self._graph.nodelist
+        return [(nodelist[u], nodelist[v], d) for (u, v), d
+                in zip(self._graph.edge_index().tolist(), self._graph.edge_column(key, default))]
+
+
+class CsrDegreeView:
+    def __init__(self, g: UndirectedCsrGraph):
+        self._graph = g
+
+    def __getitem__(self, n: node.Node) -> int:
+        indptr, _indices, _slots = self._graph.csr()
+        i = self._graph.index(n)
+        return int(indptr[i+1] - indptr[i])
+
+
+def _edge_keys(u: Sequence[int], v: Sequence[int]) -> np.ndarray:
+    u, v = np.asarray(u, dtype=np.int64), np.asarray(v, dtype=np.int64)
+    return (np.minimum(u, v) << 32) | np.maximum(u, v)
+
+
+def _object_array(values: Sequence) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        array[i] = v
+    return array
+
+
+def networkx_view(g: GraphType) -> nx.Graph:
+    '''
+    g itself if it is networkx graph, else networkx graph built from it.
+    '''
+    return g.to_networkx() if isinstance(g, UndirectedCsrGraph) else g
+
+
+GraphType = NewType('GraphType', Union[UndirectedGraph, DirectedGraph,
+                                       UndirectedMultiGraph, DirectedMultiGraph, UndirectedCsrGraph])
@@ -12,18 +12,22 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class AreaField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
-        dist = physics.distance(self.colliders.pos)
-        attr = nx.get_node_attributes(self.graph, rc.collider_index_key)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
+        attr = dict(self.graph.nodes(rc.collider_index_key))
         root_index = attr[self.rootnode]
-        for node in self.nodes:
-            if node.is_root():
-                node.oracle_sendable.update(
-                    [n.identifier for n in self.nodes if not n.is_root()])
-            else:
-                node.oracle_sendable.update(
-                    self.same_area(node, attr[node], root_index))
+        self.root_index = root_index
+        self.initial_pos = self.colliders.pos.clone()
+        if nodeoracle:
+            for node in self.nodes:
+                if node.is_root():
+                    node.oracle_sendable.update(
+                        [n.identifier for n in self.nodes if not n.is_root()])
+                else:
+                    node.oracle_sendable.update(
+                        self.same_area(node, attr[node], root_index))
 
     def same_area(self, n: node.Node, index: int, root_index: int) -> List[node.Node]:
         pos = self.colliders.pos
@@ -33,8 +37,27 @@ class AreaField(simulator.BroadcastLoggingField):
         opposite = torch.where(area < 0)
         return [self.nodes[i].identifier for i in opposite[0]]
 
+    def oracle_mask(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        '''
+        same_area() for each edge by initial positions, and the root can send to all nodes.
+        '''
+        pos, r = self.initial_pos, self.root_index
+        rad = torch.tensor([math.pi/2], dtype=torch.float, device=rc.device)
+        rotmat = torch.tensor([[torch.cos(rad), -torch.sin(rad)],
+                               [torch.sin(rad), torch.cos(rad)]],
+                              dtype=torch.float, device=rc.device)
+        o, root = pos[src], pos[r][None, :]
+        rotated = (root - o) @ rotmat.T + o     # physics.rotation2d of each edge
+        u, p, b = pos[dst] - rotated, o - rotated, root - rotated
+        cross = u[:, 1] * p[:, 0] - u[:, 0] * p[:, 1]
+        basecross = p[:, 0] * b[:, 1] - p[:, 1] * b[:, 0]
+        area = torch.sign(basecross) * cross    # physics.judge_region from basepoint
+        return torch.where(src == r, dst != r, area < 0)
+
 
 class AreaNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
@@ -9,20 +9,24 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class BftField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
         for parent, child in self.breadth_first_tree().edges():
             parent.oracle_sendable.add(child.identifier)
-            if rc.bft_edge_color:
+            if rc.bft_edge_color and not rc.headless:
                 edge = self.graph.edges[parent, child][rc.edge_key]
                 edge.drawable().color = rc.bft_edge_color
                 edge.drawable().width = rc.colored_edge_width
 
     def breadth_first_tree(self) -> nx.DiGraph:
-        return nx.bfs_tree(self.graph, self.rootnode)
+        return nx.bfs_tree(graph.networkx_view(self.graph), self.rootnode)
 
 
 class BftNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
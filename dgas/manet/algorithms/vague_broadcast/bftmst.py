@@ -9,21 +9,25 @@ from dgas.manet.algorithms.vague_broadcast import simulator, bft, mst
 
 class BftMstField(bft.BftField, mst.MstField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
         bft_color, mst_color = rc.bft_edge_color, rc.mst_edge_color
         rc.bft_edge_color = rc.mst_edge_color = None
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
         rc.bft_edge_color, rc.mst_edge_color = bft_color, mst_color
         indic = {node.identifier: node for node in self.nodes}
         for node in self.nodes:
             for child_id in node.oracle_sendable:
-                if rc.bftmst_edge_color:
+                if rc.bftmst_edge_color and not rc.headless:
                     edge = self.graph.edges[node, indic[child_id]][rc.edge_key]
                     edge.drawable().color = rc.bftmst_edge_color
                     edge.drawable().width = rc.colored_edge_width
 
 
 class BftMstNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
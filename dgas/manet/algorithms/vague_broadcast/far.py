@@ -11,22 +11,31 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class FarField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
-        dist = physics.distance(colliders.pos)
-        attr = nx.get_node_attributes(self.graph, rc.collider_index_key)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
+        attr = dict(self.graph.nodes(rc.collider_index_key))
         root_index = attr[self.rootnode]
-        for node in self.nodes:     # we can use enumerate()
-            for other in self.nodes:
-                u, v = attr[node], attr[other]
-                if node != other and self.is_far(dist, root_index, u, v):
-                    node.oracle_sendable.add(other.identifier)
+        self.root_distance = torch.norm(colliders.pos - colliders.pos[root_index], dim=-1)
+        if nodeoracle:
+            dist = colliders.geometry.distance()
+            for node in self.nodes:     # we can use enumerate()
+                for other in self.nodes:
+                    u, v = attr[node], attr[other]
+                    if node != other and self.is_far(dist, root_index, u, v):
+                        node.oracle_sendable.add(other.identifier)
 
     def is_far(self, dist: torch.Tensor, r: int, u: int, v: int) -> bool:
         return dist[r, u] < dist[r, v]
 
+    def oracle_mask(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        return self.root_distance[src] < self.root_distance[dst]
+
 
 class FarNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import Tuple, Type, Dict
 
+import torch
+
 
 from dgas import rc, node, graph
 from dgas.manet.algorithms.vague_broadcast import simulator
@@ -8,14 +10,22 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class FloodingField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
-        for node in self.nodes:
-            node.oracle_sendable = set(
-                n.identifier for n in self.graph.nodes())
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
+        if nodeoracle:
+            for node in self.nodes:
+                node.oracle_sendable = set(
+                    n.identifier for n in self.graph.nodes())
+
+    def oracle_mask(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        return torch.ones_like(src, dtype=torch.bool)
 
 
 class FloodingNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Tuple, Type, Dict
 
 import networkx as nx
+import torch
 
 from dgas import rc, node, graph
 from dgas.manet.algorithms.vague_broadcast import simulator, hop
@@ -9,14 +10,18 @@ from dgas.manet.algorithms.vague_broadcast import simulator, hop
 
 class GthopField(hop.HopField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
 
-    def is_far(self, d: Dict[node.Node, int], u: node.Node, v: node.Node) -> bool:
-        return d.get(u, float('inf')) < d.get(v, float('inf'))
+    def is_far_hop(self, u: float, v: float) -> bool:
+        return u < v
 
 
 class GthopNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
@@ -2,6 +2,7 @@ from __future__ import annotations
 from typing import Tuple, Type, Dict
 
 import networkx as nx
+import torch
 
 from dgas import rc, node, graph
 from dgas.manet.algorithms.vague_broadcast import simulator
@@ -9,22 +10,37 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class HopField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
         hop = self.shotest_path_hop()
-        for node in self.nodes:
-            for other in self.nodes:
-                if node != other and self.is_far(hop, node, other):
-                    node.oracle_sendable.add(other.identifier)
+        hops = [float('inf')] * len(self.nodes)
+        for n, i in self.node_index().items():
+            hops[i] = hop.get(n, float('inf'))
+        self.hop = torch.tensor(hops, device=rc.device)
+        if nodeoracle:
+            for node in self.nodes:
+                for other in self.nodes:
+                    if node != other and self.is_far(hop, node, other):
+                        node.oracle_sendable.add(other.identifier)
 
     def is_far(self, d: Dict[node.Node, int], u: node.Node, v: node.Node) -> bool:
-        return d.get(u, float('inf')) <= d.get(v, float('inf'))
+        return self.is_far_hop(d.get(u, float('inf')), d.get(v, float('inf')))
+
+    def is_far_hop(self, u: float, v: float) -> bool:
+        return u <= v
+
+    def oracle_mask(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        return self.is_far_hop(self.hop[src], self.hop[dst])
 
     def shotest_path_hop(self) -> Dict:
-        return nx.shortest_path_length(self.graph, source=self.rootnode)
+        return nx.shortest_path_length(graph.networkx_view(self.graph), source=self.rootnode)
 
 
 class HopNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
@@ -9,14 +9,16 @@ from dgas.manet.algorithms.vague_broadcast import simulator
 
 class MstField(simulator.BroadcastLoggingField):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
-        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None,
+                 nodeoracle=True):
+        super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist,
+                         nodeoracle=nodeoracle)
         mst = self.minimum_spanning_tree()
         mst_children = dict(nx.bfs_successors(mst, self.rootnode))
         for node in self.nodes:
             for child in mst_children.get(node, []):
                 node.oracle_sendable.add(child.identifier)
-                if rc.mst_edge_color:
+                if rc.mst_edge_color and not rc.headless:
                     edge = self.graph.edges[node, child][rc.edge_key]
                     edge.drawable().color = rc.mst_edge_color
                     edge.drawable().width = rc.colored_edge_width
@@ -30,6 +32,8 @@ class MstField(simulator.BroadcastLoggingField):
 
 
 class MstNode(simulator.BroadcastNode):
+    __slots__ = ()
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
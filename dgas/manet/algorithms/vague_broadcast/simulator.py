@@ -1,16 +1,18 @@
 from __future__ import annotations
-from typing import Tuple, Type, Dict
+from typing import Tuple, Type, Dict, List, Callable, Sequence
 import json
 import datetime as dt
 import os
+import shutil
+import tempfile
 
 import torch
 import matplotlib.pyplot as plt
-import matplotlib.animation as anm
 
 
-from dgas import rc, node, edge, message, graph, result, daemon, plot
-from dgas.manet import collider, physics, field
+from dgas import rc, node, edge, message, graph, result, daemon, plot, vertex, time, stream
+from dgas.manet import collider, physics, field, batch, trace
+from dgas.manet.algorithms.vague_broadcast import store as resultstore
 
 
 class BroadcastFieldRecord(result.FieldRecord):
@@ -20,11 +22,32 @@ class BroadcastFieldRecord(result.FieldRecord):
 
 
 class BroadcastLoggingField(field.LoggingGravityField):
+    '''
+    if not nodeoracle, fields whose oracle is O(n^2) don't fill oracle_sendable of nodes,
+    and oracle_mask() is the only oracle (for BroadcastProgram).
+    '''
+
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
-                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
+                 xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None, nodeoracle=True):
         super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
         self.rootnode = [n for n in g.nodes() if n.is_root][0]
         self.record = BroadcastFieldRecord()
+        self.nodeoracle = nodeoracle
+        self._oracle_keys: torch.Tensor = None
+
+    def oracle_mask(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        '''
+        whether node of collider index src[k] can send to dst[k], same as oracle_sendable.
+        this builds sorted keys of all oracle_sendable at first, so override if it is O(n^2).
+        '''
+        n = len(self.nodes)
+        if self._oracle_keys is None:
+            index = self.node_index()
+            ids = {nod.identifier: index[nod] for nod in self.nodes}
+            keys = [index[nod] * n + ids[i] for nod in self.nodes
+                    for i in nod.oracle_sendable if i in ids]
+            self._oracle_keys = torch.tensor(sorted(keys), dtype=torch.long, device=src.device)
+        return torch.isin(src * n + dst, self._oracle_keys)
 
     def update(self, t):
         self.record.frame = t
@@ -32,8 +55,8 @@ class BroadcastLoggingField(field.LoggingGravityField):
 
 
 class BroadcastNodeRecord(result.NodeRecord):
-    def __init__(self, identifier: rc.NodeID):
-        super().__init__(identifier)
+    def __init__(self, identifier: rc.NodeID, registry: message.MessageTable = None):
+        super().__init__(identifier, registry)
         self.broadcasted_frame = -1
         self.number_of_sended = 0
         self.number_of_received = 0
@@ -46,11 +69,13 @@ class BroadcastNodeRecord(result.NodeRecord):
 
 
 class BroadcastNode(node.LoggingNode):
+    __slots__ = ('oracle_sendable', 'received', 'sended', 'sended_frame', 'received_message')
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
         super().__init__(g, identifier=identifier, drawable=drawable)
-        self.record = BroadcastNodeRecord(identifier)
+        self.record = BroadcastNodeRecord(identifier, getattr(g, 'messagetable', None))
         self.oracle_sendable = set()
         self.received = False
         self.sended = False
@@ -61,7 +86,7 @@ class BroadcastNode(node.LoggingNode):
         return self.identifier == 0
 
     def oracle_broadcast(self, msg: rc.MessageType):
-        to = set(self.neighbors()) & self.oracle_sendable
+        to = self.oracle_sendable & self.neighbors_id().keys()
         self.broadcast_to(msg, to)
         self.sended = True
         self.record.broadcasted_frame = self.record.frame
@@ -70,7 +95,8 @@ class BroadcastNode(node.LoggingNode):
     def update(self, t: rc.GlobalTime):
         if t == 0 and self.is_root():
             self.on_receive('msg')     # if message receive, send message later
-            self.drawable().color = rc.root_color
+            if not rc.headless:
+                self.drawable().color = rc.root_color
             self.record.number_of_received -= 1
         if t == self.sended_frame:
             self.oracle_broadcast(self.received_message)
@@ -82,19 +108,171 @@ class BroadcastNode(node.LoggingNode):
         if not self.sended:
             self.sended_frame = self.record.frame + rc.node_delay
             self.received_message = msg
-        if not self.is_root():
+        if not self.is_root() and not rc.headless:
             self.drawable().color = rc.broadcasted_color
 
 
+class BroadcastProgram(vertex.VertexProgram):
+    '''
+    BroadcastNode of all nodes as tensors. sends of a frame are one masked product over edges,
+    and messages in flight are edges in a ring buffer indexed by arrival frame.
+    the same frames and counts as BroadcastNode are kept, including its logging frames.
+    oracle(src, dst) is the mask of sendable edges, as BroadcastLoggingField.oracle_mask().
+    '''
+
+    def __init__(self, root: torch.Tensor, oracle: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+                 nodes: Sequence[BroadcastNode] = (), clashed: torch.Tensor = None,
+                 msg: rc.MessageType = 'msg'):
+        super().__init__(nodes, n=len(root))
+        device = root.device
+        self.oracle = oracle
+        self.msg = msg
+        self.root = root
+        self.clashed = torch.zeros_like(root) if clashed is None else clashed
+        self.received = torch.zeros(self.n, dtype=torch.bool, device=device)
+        self.sended = torch.zeros(self.n, dtype=torch.bool, device=device)
+        self.sended_frame = torch.full((self.n,), -1, dtype=torch.long, device=device)
+        self.broadcasted_frame = torch.full((self.n,), -1, dtype=torch.long, device=device)
+        self.number_of_sended = torch.zeros(self.n, dtype=torch.long, device=device)
+        self.number_of_received = torch.zeros(self.n, dtype=torch.long, device=device)
+        self.last_received_frame = torch.full((self.n,), -1, dtype=torch.long, device=device)
+        # life 1 message is received in the same frame as it is sended
+        self.in_flight: List[List[torch.Tensor]] = [[] for _ in range(max(rc.edge_weight, 1))]
+        self.sended_log: List[Tuple[rc.GlobalTime, torch.Tensor]] = []
+        self.received_log: List[Tuple[rc.GlobalTime, torch.Tensor]] = []
+
+    def step(self, t: rc.GlobalTime, edge_index: torch.Tensor):
+        active = ~self.clashed
+        if t == 0:  # root receive message by itself, which is not counted
+            root = self.root & active
+            self.received |= root
+            self.sended_frame[root & ~self.sended] = rc.node_delay
+            if not rc.headless and self.nodes:
+                for i in torch.where(root)[0].tolist():
+                    self.nodes[i].drawable().color = rc.root_color
+        sender = (self.sended_frame == t) & active
+        if sender.any():
+            # node's logging frame is updated after sending, so it is the previous frame
+            logframe = max(t - 1, 0)
+            send = sender[edge_index[:, 0]] & self.oracle(edge_index[:, 0], edge_index[:, 1])
+            edges = edge_index[send]
+            self.number_of_sended += torch.bincount(edges[:, 0], minlength=self.n)
+            self.sended |= sender
+            self.broadcasted_frame[sender] = logframe
+            arrival = t + len(self.in_flight) - 1
+            self.in_flight[arrival % len(self.in_flight)].append(edges)
+            self.sended_log.append((logframe, edges))
+        self.frame = t
+
+    def deliver(self, t: rc.GlobalTime):
+        slot = self.in_flight[t % len(self.in_flight)]
+        if not slot:
+            return
+        edges = torch.cat(slot)
+        slot.clear()
+        self.received_log.append((t, edges))
+        count = vertex.propagate(edges, torch.ones(len(edges), dtype=torch.bool,
+                                                   device=edges.device), self.n)
+        self.last_received_frame[count > 0] = t
+        arrived = (count > 0) & ~self.clashed
+        self.number_of_received += torch.where(arrived, count, torch.zeros_like(count))
+        if not rc.headless and self.nodes:
+            for i in torch.where(arrived & ~self.received & ~self.root)[0].tolist():
+                self.nodes[i].drawable().color = rc.broadcasted_color
+        self.received |= arrived
+        self.sended_frame[arrived & ~self.sended] = t + rc.node_delay
+
+    def succeed(self) -> bool:
+        return bool(self.received.all())
+
+    def convergence(self) -> bool:
+        return bool((self.sended == self.received).all())
+
+    def write_back(self):
+        for i, nod in enumerate(self.nodes):
+            nod.received = bool(self.received[i])
+            nod.sended = bool(self.sended[i])
+            frame = int(self.sended_frame[i])
+            nod.sended_frame = None if frame < 0 else frame
+            nod.received_message = self.msg if nod.received else None
+            nod.record.frame = self.frame
+            nod.record.broadcasted_frame = int(self.broadcasted_frame[i])
+            nod.record.number_of_sended = int(self.number_of_sended[i])
+            nod.record.number_of_received = int(self.number_of_received[i])
+            nod.record.clear()
+        sended = self.event_frames(self.sended_log, 0)
+        received = self.event_frames(self.received_log, 1)
+        for i, nod in enumerate(self.nodes):
+            nod.record.sended_count, nod.record.first_sended_frame = sended[i]
+            nod.record.received_count, nod.record.first_received_frame = received[i]
+            nod.record.last_received_frame = int(self.last_received_frame[i])
+        if self.nodes and self.nodes[0].record.level == rc.node_log_full:
+            for frame, edges in self.sended_log:
+                for u, v in edges.tolist():
+                    self.nodes[u].record.sended_log.append(frame, self.nodes[u], self.nodes[v], self.msg)
+            for frame, edges in self.received_log:
+                for u, v in edges.tolist():
+                    self.nodes[v].record.received_log.append(frame, self.nodes[u], self.nodes[v], self.msg)
+
+    def event_frames(self, log: List[Tuple[rc.GlobalTime, torch.Tensor]],
+                     column: int) -> List[Tuple[int, rc.GlobalTime]]:
+        '''
+        (number of events, first frame or -1) of each node, whose events are edges[:, column] of log.
+        '''
+        count = torch.zeros(self.n, dtype=torch.long, device=self.root.device)
+        first = torch.full((self.n,), -1, dtype=torch.long, device=self.root.device)
+        for frame, edges in log:
+            index = edges[:, column]
+            first[index[first[index] < 0]] = frame
+            count += torch.bincount(index, minlength=self.n)
+        return list(zip(count.tolist(), first.tolist()))
+
+
+def field_program(f: BroadcastLoggingField, msg: rc.MessageType = 'msg') -> BroadcastProgram:
+    '''
+    BroadcastProgram of the nodes of f, in order of collider index.
+    '''
+    index = f.node_index()
+    nodes = sorted(f.nodes, key=lambda nod: index[nod])
+    device = f.colliders.pos.device
+    return BroadcastProgram(torch.tensor([nod.is_root() for nod in nodes], device=device),
+                            f.oracle_mask, nodes=nodes,
+                            clashed=torch.tensor([nod.clashed for nod in nodes], device=device),
+                            msg=msg)
+
+
+def end_condition(simulator: BroadcastSimulator) -> bool:
+    '''
+    condition of conditionend, module level so that simulators can be pickled.
+    '''
+    return simulator.convergence() or not simulator.connectivity()
+
+
 class BroadcastSimulator:
+    '''
+    if vectorized, all nodes are advanced by BroadcastProgram and written back to nodes
+    after simulation. messages are not drawn in that mode.
+    if replay is given, the field replays the mobility trace instead of a random field.
+    '''
+
     def __init__(self, algorithm: str, n: int, xlen: rc.Number, ylen: rc.Number,
                  node_class: Type[BroadcastNode] = None,
                  field_class: Type[BroadcastLoggingField] = None,
                  untiltime: rc.GlobalTime = None, timeout: rc.GlobalTime = None, conditionend=False,
-                 identifierdraw=False, edgedraw=True, messagedraw=False, **kwargs):
+                 identifierdraw=False, edgedraw=True, messagedraw=False, vectorized=False,
+                 replay: trace.MobilityTrace = None, **kwargs):
         self.algorithm = algorithm
-        self.daemon = daemon.ManetDaemon(
-            field.init_random(n, xlen, ylen, node_class, field_class))
+        if replay is not None:
+            f = trace.init_replay(replay, node_class, field_class, nodeoracle=not vectorized)
+        else:
+            f = field.init_random(n, xlen, ylen, node_class, field_class,
+                                  nodeoracle=not vectorized)
+        self.program: BroadcastProgram = None
+        if vectorized:
+            self.program = field_program(f)
+            self.daemon = vertex.VertexDaemon(f, self.program)
+        else:
+            self.daemon = daemon.ManetDaemon(f)
         self.untiltime = untiltime
         self.timeout = timeout
         self.condition_end = conditionend
@@ -113,21 +291,24 @@ class BroadcastSimulator:
         return self.daemon.field
 
     def succeed(self, nomessage=True) -> bool:
+        if self.program:
+            return self.program.succeed()
         broadcasted = all(node.received for node in self.nodes())
         return broadcasted
 
     def convergence(self) -> bool:
+        if self.program:
+            return self.program.convergence()
         return all(node.sended == node.received for node in self.nodes())
 
     def failed(self) -> bool:
         return self.convergence() and not self.success()
 
     def connectivity(self) -> List[bool]:
-        return all(self.daemon.field.record.connectivity)
+        return self.daemon.field.record.connected
 
     def convergence_frame(self) -> rc.GlobalTime:
-        return max(max([mr.frame for mr in node.record.received_message], default=0)
-                   for node in self.nodes())
+        return max(0, max(node.record.last_received_frame for node in self.nodes()))
 
     def number_of_sended_messages(self) -> int:
         return sum(node.record.number_of_sended for node in self.nodes())
@@ -163,22 +344,23 @@ class BroadcastSimulator:
                 rc.key_result_convergence_frame: self.convergence_frame(),
                 rc.key_result_success: self.succeed()}
 
-    def animate(self, **kwargs) -> anm.ArtistAnimation:
+    def animate_to(self, path: str, **kwargs) -> int:
+        '''
+        simulate with frames rendered to path during simulation (plot.stream_manet_daemon),
+        and return the number of rendered frames.
+        '''
         if self.timeout == None and self.untiltime == None and not self.condition_end:
             raise ValueError(
                 'no timeout and untiltime and convergence cause of infinite loop.')
-        elif self.condition_end:
-            return plot.artistanimate_manet_daemon(
-                self.daemon, identifier=self.id_draw,
-                edge=self.edge_draw, message=self.message_draw,
-                untiltime=self.untiltime, timeout=self.timeout,
-                condition=lambda x: x.convergence() or not x.connectivity(), arg=self,
-                **self.kwargs, **kwargs)
-        else:
-            return plot.artistanimate_manet_daemon(
-                self.daemon, identifier=self.id_draw,
-                edge=self.edge_draw, message=self.message_draw,
-                untiltime=self.untiltime, timeout=self.timeout, **self.kwargs, **kwargs)
+        condition = {'condition': end_condition, 'arg': self} if self.condition_end else {}
+        rendered = plot.stream_manet_daemon(
+            self.daemon, path, identifier=self.id_draw,
+            edge=self.edge_draw, message=self.message_draw,
+            untiltime=self.untiltime, timeout=self.timeout,
+            **condition, **self.kwargs, **kwargs)
+        if self.program:
+            self.program.write_back()
+        return rendered
 
     def simulate(self):
         if self.timeout == None and self.untiltime == None and not self.condition_end:
@@ -186,16 +368,30 @@ class BroadcastSimulator:
                 'no timeout and untiltime and convergence cause of infinite loop.')
         elif self.condition_end:
             self.daemon.main_loop(untiltime=self.untiltime, timeout=self.timeout,
-                                  condition=lambda x: x.convergence() or not x.connectivity(),
+                                  condition=end_condition,
                                   arg=self)
         else:
             self.daemon.main_loop(untiltime=self.untiltime,
                                   timeout=self.timeout)
+        if self.program:
+            self.program.write_back()
+
+    def field_result_dict(self) -> Dict[str, Any]:
+        '''
+        positions and connectivity are the names of their files if they are not kept in record.
+        '''
+        field_result = self.field().record.to_dict()
+        if self.field().frames is not None:
+            field_result[rc.key_pos_log] = field_result[rc.key_connectivity_log] = \
+                stream.filename(rc.key_frames_result, self.field().frames.compress)
+        if self.field().trajectory is not None:
+            field_result[rc.key_pos_log] = rc.trajectory_filename
+        return field_result
 
     def result_dict(self) -> Dict[str, Any]:
         whole_result = self.whole_result_dict()
         # graph_result = self.field().graph.record.to_dict()
-        field_result = self.field().record.to_dict()
+        field_result = self.field_result_dict()
         nodes_result = [node.record.to_dict() for node in self.nodes()]
         return {rc.key_whole_result: whole_result,
                 # rc.key_graph_result: graph_result,
@@ -212,22 +408,199 @@ class BroadcastSimulator:
         dirname = self.make_dirname(dirname)
         jsondir = os.path.join(dirpath, dirname)
         os.makedirs(jsondir, exist_ok=mkdir)
-        for resulttype, resultjson in self.result_dict().items():
+        if self.field().frames is not None:
+            self.save_as_ndjson(jsondir)
+        else:
+            for resulttype, resultjson in self.result_dict().items():
+                with open(os.path.join(jsondir, resulttype + '.json'), 'w') as f:
+                    json.dump(resultjson, f, indent=4)
+        if self.field().trajectory is not None:
+            self.field().trajectory.save(os.path.join(jsondir, rc.trajectory_filename))
+            self.field().edges.save(os.path.join(jsondir, rc.edges_filename))
+
+    def save_as_ndjson(self, jsondir: str):
+        '''
+        whole and field results as json, nodes as json lines of a node, serialized one by one,
+        and frames (written during simulation) are moved to jsondir.
+        '''
+        for resulttype, resultjson in ((rc.key_whole_result, self.whole_result_dict()),
+                                       (rc.key_field_result, self.field_result_dict())):
             with open(os.path.join(jsondir, resulttype + '.json'), 'w') as f:
                 json.dump(resultjson, f, indent=4)
+        frames = self.field().frames
+        nodes = stream.NdjsonWriter(
+            os.path.join(jsondir, stream.filename(rc.key_nodes_result, frames.compress)),
+            compress=frames.compress)
+        nodes.extend(node.record.to_dict() for node in self.nodes())
+        nodes.close()
+        frames.save(os.path.join(jsondir, stream.filename(rc.key_frames_result, frames.compress)))
+
+    def save_to_store(self, store: resultstore.ResultStore) -> int:
+        '''
+        append results to store instead of json files, trajectory and frames files are not kept.
+        '''
+        resultdict = self.result_dict()
+        if self.field().frames is not None:
+            resultdict[rc.key_field_result].pop(rc.key_connectivity_log)
+        if self.field().trajectory is not None or self.field().frames is not None:
+            resultdict[rc.key_field_result].pop(rc.key_pos_log)
+        self.field().discard_streams()
+        return store.append(resultdict)
 
     def run_and_save(self, dirpath: str, dirname: str = None, ani=False, mkdir=False,
-                     connectedonly=False) -> Union[None, str]:
+                     connectedonly=False,
+                     store: resultstore.ResultStore = None) -> Union[None, str, int]:
+        '''
+        if store is given, results are appended to it (and animation is not saved),
+        and its run id is returned instead of the directory.
+        animation is rendered to a temporary file during simulation and moved if saved.
+        '''
+        anipath = None
         if ani:
-            anm = self.animate(interval=1000/30)
+            fd, anipath = tempfile.mkstemp(suffix=os.path.splitext(rc.animation_filename)[1])
+            os.close(fd)
+            self.animate_to(anipath)
         else:
             self.simulate()
-        if self.connectivity() or not connectedonly:
+        saved = self.connectivity() or not connectedonly
+        resultdir = None
+        if saved and store is not None:
+            resultdir = self.save_to_store(store)
+        elif saved:
             dirname = self.make_dirname(dirname)
             resultdir = os.path.join(dirpath, dirname)
             os.makedirs(resultdir, exist_ok=mkdir)
             self.save_as_json(dirpath, dirname, mkdir=mkdir)
             if ani:
-                anm.save(os.path.join(resultdir, rc.animation_filename),
-                         writer='pillow')
-            return resultdir
+                animation = os.path.join(resultdir, rc.animation_filename)
+                shutil.move(anipath, animation)
+                # mkstemp makes the file 0600, so readable as other result files
+                shutil.copymode(os.path.join(resultdir, rc.key_whole_result + '.json'), animation)
+        else:
+            self.field().discard_streams()
+        if anipath is not None and os.path.exists(anipath):
+            os.remove(anipath)
+        return resultdir
+
+
+class BatchBroadcastSimulator:
+    '''
+    B replicas of simulator_class advanced together by BatchGravityField, and BroadcastProgram
+    over the disjoint union of replicas. each replica is initialized by simulator_class,
+    so the random states are the same as B simulators made one after another.
+    a replica finishes when its own condition is satisfied, and its whole result is fixed then.
+    only whole results are kept, nodes and messages are not drawn.
+    physics and the oracle are dense over replicas x n x n, so batches are for small n,
+    see rc.batch_max_pairs.
+    '''
+
+    def __init__(self, simulator_class: Type[BroadcastSimulator], n: int, batchsize: int,
+                 xlen: rc.Number, ylen: rc.Number,
+                 untiltime: rc.GlobalTime = None, timeout: rc.GlobalTime = None, conditionend=False):
+        # replicas are made one at a time and only their initial state is kept
+        pos, vel, oracles, roots = [], [], [], []
+        for _ in range(batchsize):
+            replica = simulator_class(n, xlen, ylen, vectorized=True)
+            f = replica.field()
+            src = torch.arange(n, device=f.colliders.pos.device).repeat_interleave(n)
+            dst = torch.arange(n, device=f.colliders.pos.device).repeat(n)
+            pos.append(f.colliders.pos)
+            vel.append(f.colliders.vel)
+            oracles.append(f.oracle_mask(src, dst).view(n, n))
+            roots.append(replica.program.root)
+        self.algorithm = replica.algorithm
+        self.n = n
+        self.batchsize = batchsize
+        colliders = batch.BatchColliderList(rc.manet_node_size, rc.communication_radius,
+                                            torch.stack(pos), torch.stack(vel))
+        self.field = batch.BatchGravityField(colliders, xlen, ylen)
+        device = colliders.pos.device
+        self.oracle_table = torch.stack(oracles)    # oracle of all pairs
+        self.program = BroadcastProgram(torch.cat(roots), self.oracle)
+        self.untiltime = untiltime
+        self.timeout = timeout
+        self.condition_end = conditionend
+        self.frame = 0
+        self.connectivity = torch.ones(batchsize, dtype=torch.bool, device=device)
+        self.results: List[Dict[str, Any]] = [None] * batchsize
+
+    def oracle(self, src: torch.Tensor, dst: torch.Tensor) -> torch.Tensor:
+        return self.oracle_table[src // self.n, src % self.n, dst % self.n]
+
+    def replica_view(self, x: torch.Tensor) -> torch.Tensor:
+        return x.view(self.batchsize, self.n)
+
+    def succeed(self) -> torch.Tensor:
+        return self.replica_view(self.program.received).all(dim=1)
+
+    def convergence(self) -> torch.Tensor:
+        return self.replica_view(self.program.sended == self.program.received).all(dim=1)
+
+    def whole_result_dict(self, b: int) -> Dict[str, Any]:
+        p = self.program
+        sended, received = (self.replica_view(x)[b] for x in
+                            (p.number_of_sended, p.number_of_received))
+        sendednodes, receivednodes = int((sended > 0).sum()), int((received > 0).sum())
+        return {rc.key_result_algorithm: self.algorithm,
+                rc.key_result_number_of_nodes: self.n,
+                rc.key_result_simulate_terminate_frame: self.frame,
+                rc.key_result_delay: rc.node_delay,
+                rc.key_result_all_sended_messages: int(sended.sum()),
+                rc.key_result_all_received_messages: int(received.sum()),
+                rc.key_result_all_sended_nodes: sendednodes,
+                rc.key_result_all_sended_nodes_per_whole: sendednodes / self.n,
+                rc.key_result_all_received_nodes: receivednodes,
+                rc.key_result_all_received_nodes_per_whole: receivednodes / self.n,
+                rc.key_result_connectivity: bool(self.connectivity[b]),
+                rc.key_result_convergence: bool(self.convergence()[b]),
+                rc.key_result_convergence_frame: max(0, int(self.replica_view(p.last_received_frame)[b].max())),
+                rc.key_result_success: bool(self.succeed()[b])}
+
+    def finish(self, replicas: torch.Tensor):
+        for b in torch.where(replicas)[0].tolist():
+            if self.results[b] is None:
+                self.results[b] = self.whole_result_dict(b)
+
+    def each_loop(self, t: rc.GlobalTime):
+        self.connectivity &= self.field.connectivity    # recorded before update, as LoggingGravityField
+        self.frame = t
+        self.field.update(t)
+        self.program.step(t, self.field.directed_edge_index())
+        self.program.deliver(t)
+
+    def simulate(self):
+        if self.timeout == None and self.untiltime == None and not self.condition_end:
+            raise ValueError(
+                'no timeout and untiltime and convergence cause of infinite loop.')
+        for t in time.global_time(self.untiltime, self.timeout):
+            self.each_loop(t)
+            if self.condition_end and (self.untiltime == None or self.untiltime < t):
+                self.finish(self.convergence() | ~self.connectivity)
+                if all(whole is not None for whole in self.results):
+                    break
+        self.finish(torch.ones(self.batchsize, dtype=torch.bool))
+
+    def make_dirname(self, b: int) -> str:
+        ts = hex(int(dt.datetime.now().timestamp()*10**6) + b)
+        return f'{self.algorithm}{self.n}nodes{ts}'
+
+    def run_and_save(self, dirpath: str, mkdir=False, connectedonly=False,
+                     store: resultstore.ResultStore = None) -> List[Union[str, int]]:
+        '''
+        whole.json of each replica is saved in its own directory, same as BroadcastSimulator,
+        or appended to store if given.
+        '''
+        self.simulate()
+        resultdirs = []
+        for b, whole in enumerate(self.results):
+            if connectedonly and not whole[rc.key_result_connectivity]:
+                continue
+            if store is not None:
+                resultdirs.append(store.append({rc.key_whole_result: whole}))
+            else:
+                resultdir = os.path.join(dirpath, self.make_dirname(b))
+                os.makedirs(resultdir, exist_ok=mkdir)
+                with open(os.path.join(resultdir, rc.key_whole_result + '.json'), 'w') as f:
+                    json.dump(whole, f, indent=4)
+                resultdirs.append(resultdir)
+        return resultdirs
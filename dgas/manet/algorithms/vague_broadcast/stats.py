@@ -0,0 +1,110 @@
+from __future__ import annotations
+from typing import Tuple, Dict, List, Any
+import math
+
+from dgas import rc
+
+
+def wilson_interval(successes: int, n: int, z: float = None) -> Tuple[float, float]:
+    '''
+    Wilson score interval of a rate, which is valid for the rate 0 or 1 and small n.
+    '''
+    z = rc.adaptive_confidence_z if z is None else z
+    if n == 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z**2 / n
+    center = (p + z**2 / (2*n)) / denominator
+    half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return center - half, center + half
+
+
+def rate_min_times(error: float = None, z: float = None) -> int:
+    '''
+    the fewest runs whose Wilson interval can be within error, reached when all runs agree.
+    '''
+    error = rc.adaptive_rate_error if error is None else error
+    z = rc.adaptive_confidence_z if z is None else z
+    return max(math.ceil(z**2 * (1 / (2 * error) - 1)), 1)
+
+
+class Welford:
+    '''
+    online mean and variance, numerically stable for long streams.
+    '''
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: rc.Number):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else float('inf')
+
+    def half_width(self, z: float = None) -> float:
+        '''
+        half width of the normal confidence interval of the mean.
+        '''
+        z = rc.adaptive_confidence_z if z is None else z
+        return z * math.sqrt(self.variance() / self.n) if self.n > 1 else float('inf')
+
+
+class CellStats:
+    '''
+    streaming statistics of whole results of a cell (algorithm, nodes, delay).
+    metrics are means whose interval must be within relative error of the mean,
+    and rates are boolean results whose Wilson interval must be within rate error
+    (only if rate error is set, otherwise rates are only counted).
+    '''
+
+    def __init__(self, metrics: List[str] = None, rates: List[str] = None):
+        self.metrics = {key: Welford() for key in
+                        (rc.adaptive_metrics if metrics is None else metrics)}
+        self.rates = {key: 0 for key in (rc.adaptive_rates if rates is None else rates)}
+        self.n = 0
+
+    def add(self, whole: Dict[str, Any]):
+        self.n += 1
+        for key, accumulator in self.metrics.items():
+            accumulator.add(whole[key])
+        for key in self.rates:
+            self.rates[key] += bool(whole[key])
+
+    def errors(self) -> Dict[str, float]:
+        '''
+        interval half width per target of each metric and rate, done if all are at most 1.
+        '''
+        errors = {}
+        for key, accumulator in self.metrics.items():
+            scale = abs(accumulator.mean) * rc.adaptive_relative_error
+            half = accumulator.half_width()
+            errors[key] = half / scale if scale > 0 else (0.0 if half == 0 else float('inf'))
+        if rc.adaptive_rate_error is None:
+            return errors
+        for key, successes in self.rates.items():
+            low, high = wilson_interval(successes, self.n)
+            errors[key] = (high - low) / 2 / rc.adaptive_rate_error
+        return errors
+
+    def error(self) -> float:
+        return max(self.errors().values(), default=0.0)
+
+    def done(self, mintimes: int = None) -> bool:
+        mintimes = rc.adaptive_min_times if mintimes is None else mintimes
+        return self.n >= mintimes and self.error() <= 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {rc.pd_simulated_times: self.n}
+        for key, accumulator in self.metrics.items():
+            d[key] = accumulator.mean
+            d[key + '_halfwidth'] = accumulator.half_width()
+        for key, successes in self.rates.items():
+            d[key] = successes / self.n if self.n else float('nan')
+            d[key + '_interval'] = wilson_interval(successes, self.n)
+        return d
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Dict, List, Any, Iterable, Sequence
+import json
+import sqlite3
+
+import pandas as pd
+
+from dgas import rc
+
+
+def _encode(value: Any) -> Any:
+    '''
+    scalars are stored as they are, and lists and dicts as json text.
+    '''
+    if isinstance(value, (list, dict, tuple)):
+        return json.dumps(value)
+    return value
+
+
+class ResultStore:
+    '''
+    append-only results of a sweep in one sqlite file. whole results are rows of
+    table whole (a column for each key), and field and nodes results are rows of
+    side tables with the run id of whole. tables are made from the keys of the first result,
+    and columns of keys not seen before are added (NULL in earlier rows).
+    '''
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute('PRAGMA journal_mode=WAL')   # readers don't block appends
+
+    def __enter__(self) -> ResultStore:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def tables(self) -> List[str]:
+        return [name for name, in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+
+    def _create(self, table: str, keys: Iterable[str], primary=False):
+        run = 'run INTEGER PRIMARY KEY AUTOINCREMENT' if primary else 'run INTEGER'
+        columns = ', '.join([run] + [f'"{key}"' for key in keys])
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns})')
+
+    def _add_columns(self, table: str, keys: Iterable[str]):
+        columns = {name for _, name, *_ in self.connection.execute(f'PRAGMA table_info("{table}")')}
+        for key in keys:
+            if key not in columns:
+                try:
+                    self.connection.execute(f'ALTER TABLE "{table}" ADD COLUMN "{key}"')
+                except sqlite3.OperationalError as e:   # added by another writer meanwhile
+                    if 'duplicate column' not in str(e):
+                        raise
+
+    def _insert(self, table: str, rows: Sequence[Dict[str, Any]], run: int = None) -> int:
+        keys = list(dict.fromkeys(key for row in rows for key in row))
+        self._create(table, keys, primary=run is None)
+        self._add_columns(table, keys)
+        names = ', '.join(['run'] + [f'"{key}"' for key in keys])
+        marks = ', '.join('?' * (len(keys) + 1))
+        query = f'INSERT INTO "{table}" ({names}) VALUES ({marks})'
+        values = [[run] + [_encode(row.get(key)) for key in keys] for row in rows]
+        cursor = self.connection.executemany(query, values) if len(values) > 1 \
+            else self.connection.execute(query, values[0])
+        return cursor.lastrowid if run is None else run
+
+    def append(self, resultdict: Dict[str, Any], sidetables=True) -> int:
+        '''
+        append a result_dict of BroadcastSimulator in one transaction, and return its run id.
+        '''
+        with self.connection:
+            run = self._insert(rc.key_whole_result, [resultdict[rc.key_whole_result]])
+            if sidetables:
+                for table in (rc.key_field_result, rc.key_nodes_result):
+                    rows = resultdict.get(table)
+                    rows = [rows] if isinstance(rows, dict) else rows
+                    if rows:
+                        self._insert(table, rows, run)
+        return run
+
+    def whole(self, columns: Dict[str, str] = None, where: str = None,
+              params: Sequence[Any] = ()) -> pd.DataFrame:
+        '''
+        whole results as DataFrame. only columns (key: name of DataFrame column)
+        and rows matching where (sql condition with ? of params) are read.
+        '''
+        select = '*' if columns is None else ', '.join(
+            f'"{key}" AS "{name}"' for key, name in columns.items())
+        query = f'SELECT {select} FROM "{rc.key_whole_result}"'
+        if where:
+            query += f' WHERE {where}'
+        return pd.read_sql_query(query, self.connection, params=list(params))
+
+    def side(self, table: str, runs: Sequence[int] = None) -> pd.DataFrame:
+        '''
+        rows of a side table (field or nodes) of runs (default: all runs).
+        '''
+        query = f'SELECT * FROM "{table}"'
+        if runs is not None:
+            query += f' WHERE run IN ({", ".join("?" * len(runs))})'
+        return pd.read_sql_query(query, self.connection, params=list(runs or ()))
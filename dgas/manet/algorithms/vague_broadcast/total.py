@@ -4,6 +4,7 @@ import json
 import datetime as dt
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
@@ -13,6 +14,7 @@ import matplotlib.pyplot as plt
 
 from dgas import rc, node, edge, message, graph, result, daemon, plot
 from dgas.manet import collider, physics, field
+from dgas.manet.algorithms.vague_broadcast import store
 
 
 def splitdelay(delay_int: str) -> int:
@@ -20,8 +22,10 @@ def splitdelay(delay_int: str) -> int:
     return int(re.compile(r'\d+$').findall(delay_int_str)[-1])
 
 
-def total_from(dirpath: str, walk=False) -> ConnectedTotal:
-    if walk:
+def total_from(dirpath: str, walk=False, index=False) -> ConnectedTotal:
+    if index:
+        return total_index(dirpath)
+    elif walk:
         return total_walk(dirpath)
     else:
         delay_dflist = []
@@ -66,33 +70,95 @@ def algorithm_dir(algdir: str, delay: rc.GlobalTimeDelta) -> pd.DataFrame:
     return pd.DataFrame(to_pd)
 
 
-def total_walk(dirpath: str) -> ConnectedTotal:
-    to_pd = {rc.pd_delay: [], rc.pd_algorithm: [], rc.pd_nodes: [],
-             rc.pd_messages: [], rc.pd_sended_nodes: [], rc.pd_received_nodes: [],
-             rc.pd_convergence: [], rc.pd_convergence_frame: [], rc.pd_success: []}
+def whole_row(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        whole_dic = json.load(f)
+    return {rc.pd_delay: whole_dic[rc.key_result_delay],
+            rc.pd_algorithm: whole_dic[rc.key_result_algorithm],
+            rc.pd_nodes: whole_dic[rc.key_result_number_of_nodes],
+            rc.pd_messages: whole_dic[rc.key_result_all_sended_messages],
+            rc.pd_sended_nodes: whole_dic[rc.key_result_all_sended_nodes],
+            rc.pd_received_nodes: whole_dic[rc.key_result_all_received_nodes],
+            rc.pd_convergence: whole_dic[rc.key_result_convergence],
+            rc.pd_convergence_frame: whole_dic[rc.key_result_convergence_frame],
+            rc.pd_success: whole_dic[rc.key_result_success]}
+
+
+def whole_paths(dirpath: str) -> Dict[str, int]:
+    '''
+    path and mtime (ns) of all whole.json under dirpath.
+    '''
+    paths = {}
     for current, _dirs, files in os.walk(dirpath):
         for whole in (f for f in files if f == (rc.key_whole_result + '.json')):
-            with open(os.path.join(current, whole)) as f:
-                whole_dic = json.load(f)
-            to_pd[rc.pd_delay].append(
-                whole_dic[rc.key_result_delay])
-            to_pd[rc.pd_algorithm].append(
-                whole_dic[rc.key_result_algorithm])
-            to_pd[rc.pd_nodes].append(
-                whole_dic[rc.key_result_number_of_nodes])
-            to_pd[rc.pd_messages].append(
-                whole_dic[rc.key_result_all_sended_messages])
-            to_pd[rc.pd_sended_nodes].append(
-                whole_dic[rc.key_result_all_sended_nodes])
-            to_pd[rc.pd_received_nodes].append(
-                whole_dic[rc.key_result_all_received_nodes])
-            to_pd[rc.pd_convergence].append(
-                whole_dic[rc.key_result_convergence])
-            to_pd[rc.pd_convergence_frame].append(
-                whole_dic[rc.key_result_convergence_frame])
-            to_pd[rc.pd_success].append(
-                whole_dic[rc.key_result_success])
-    return ConnectedTotal(pd.DataFrame(to_pd))
+            path = os.path.join(current, whole)
+            paths[path] = os.stat(path).st_mtime_ns
+    return paths
+
+
+def _whole_frame(paths: List[str], workers: int = None) -> pd.DataFrame:
+    columns = [rc.pd_delay, rc.pd_algorithm, rc.pd_nodes,
+               rc.pd_messages, rc.pd_sended_nodes, rc.pd_received_nodes,
+               rc.pd_convergence, rc.pd_convergence_frame, rc.pd_success]
+    with ThreadPoolExecutor(workers) as executor:
+        rows = list(executor.map(whole_row, paths))
+    return pd.DataFrame(rows, columns=columns)
+
+
+def total_walk(dirpath: str, workers: int = None) -> ConnectedTotal:
+    return ConnectedTotal(_whole_frame(list(whole_paths(dirpath)), workers))
+
+
+def total_index(dirpath: str, indexpath: str = None, workers: int = None) -> ConnectedTotal:
+    '''
+    same as total_walk, but rows are cached in an index file (default: {rc.total_index_filename}
+    in dirpath) with the mtime of each whole.json. only new or changed files are parsed,
+    and rows of removed files are dropped.
+    '''
+    indexpath = indexpath or os.path.join(dirpath, rc.total_index_filename)
+    paths = whole_paths(dirpath)
+    df, stale = None, 0
+    if os.path.exists(indexpath):
+        cached = pd.read_pickle(indexpath)
+        current = np.array([paths.get(path) == mtime for path, mtime
+                            in zip(cached[rc.pd_path], cached[rc.pd_mtime])], dtype=bool)
+        df = cached.loc[current]    # an empty list would select no columns
+        stale = len(cached) - len(df)
+    parsed = set() if df is None else set(df[rc.pd_path])
+    new = [path for path in paths if path not in parsed]
+    if new or df is None:
+        newdf = _whole_frame(new, workers)
+        newdf[rc.pd_path] = new
+        newdf[rc.pd_mtime] = [paths[path] for path in new]
+        df = newdf if df is None else pd.concat([df, newdf], ignore_index=True)
+    if new or stale or not os.path.exists(indexpath):
+        df.to_pickle(indexpath)
+    return ConnectedTotal(df.drop(columns=[rc.pd_path, rc.pd_mtime]).reset_index(drop=True))
+
+
+def total_store(path: str, delays: List[rc.GlobalTimeDelta] = None,
+                algorithms: List[str] = None) -> ConnectedTotal:
+    '''
+    ConnectedTotal of connected runs in a ResultStore. only the columns of the total
+    and the rows of given delays and algorithms are read.
+    '''
+    columns = {rc.key_result_delay: rc.pd_delay,
+               rc.key_result_algorithm: rc.pd_algorithm,
+               rc.key_result_number_of_nodes: rc.pd_nodes,
+               rc.key_result_all_sended_messages: rc.pd_messages,
+               rc.key_result_all_sended_nodes: rc.pd_sended_nodes,
+               rc.key_result_all_received_nodes: rc.pd_received_nodes,
+               rc.key_result_convergence: rc.pd_convergence,
+               rc.key_result_convergence_frame: rc.pd_convergence_frame,
+               rc.key_result_success: rc.pd_success}
+    where, params = [f'"{rc.key_result_connectivity}" = 1'], []
+    for key, values in ((rc.key_result_delay, delays), (rc.key_result_algorithm, algorithms)):
+        if values is not None:
+            where.append(f'"{key}" IN ({", ".join("?" * len(values))})')
+            params += list(values)
+    with store.ResultStore(path) as results:
+        df = results.whole(columns, ' AND '.join(where), params)
+    return ConnectedTotal(df.astype({rc.pd_convergence: bool, rc.pd_success: bool}))
 
 
 class ConnectedTotal:
@@ -0,0 +1,208 @@
+from __future__ import annotations
+from typing import Iterable, List, Dict
+
+import torch
+
+from dgas import rc
+from dgas.manet import physics
+
+
+def morton(ix: torch.Tensor, iy: torch.Tensor) -> torch.Tensor:
+    """
+    interleave the bits of the grid coordinates. O(n) in torch.
+
+    Arguments:
+        ix {torch.Tensor} -- x grid coordinate less than 2^32 (n*1)
+        iy {torch.Tensor} -- y grid coordinate less than 2^32 (n*1)
+
+    Returns:
+        torch.Tensor -- morton code (n*1)
+    """
+    def part1by1(x: torch.Tensor) -> torch.Tensor:
+        x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+        x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+        x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+        x = (x | (x << 2)) & 0x3333333333333333
+        x = (x | (x << 1)) & 0x5555555555555555
+        return x
+    return part1by1(ix) | (part1by1(iy) << 1)
+
+
+class QuadTree:
+    """
+    linear quadtree whose cells are stored level by level. O(n depth) in torch.
+    cell[l][i] is the cell of level l which include pos[i],
+    and children of cell c of level l are cells [child_start[l][c], child_end[l][c]) of level l+1.
+    bodies in leaf c (cell of level depth) are order[leaf_start[c]:leaf_start[c]+mass[depth][c]].
+    """
+
+    def __init__(self, pos: torch.Tensor, depth: int = None):
+        self.depth = depth or rc.barnes_hut_depth
+        if not 0 < self.depth <= 30:
+            raise ValueError(f'depth must be in 1..30, but {self.depth}.')
+        low = pos.min(dim=0).values
+        self.side = float((pos.max(dim=0).values - low).max()) * (1 + 1e-6) or 1.0
+        grid = ((pos - low) / self.side * 2**self.depth).long()
+        grid = torch.clamp(grid, 0, 2**self.depth - 1)
+        code, order = torch.sort(morton(grid[:, 0], grid[:, 1]))
+
+        self.cell: List[torch.Tensor] = []
+        self.mass: List[torch.Tensor] = []
+        self.com: List[torch.Tensor] = []
+        self.child_start: List[torch.Tensor] = []
+        self.child_end: List[torch.Tensor] = []
+        keys = []
+        for level in range(self.depth + 1):
+            key, inverse, count = torch.unique_consecutive(
+                code >> 2*(self.depth - level), return_inverse=True, return_counts=True)
+            cell = torch.empty_like(inverse)
+            cell[order] = inverse
+            com = torch.zeros((len(key), 2), dtype=pos.dtype, device=pos.device)
+            com.index_add_(0, cell, pos)
+            keys.append(key)
+            self.cell.append(cell)
+            self.mass.append(count.to(pos.dtype))
+            self.com.append(com / count[:, None])
+        self.order = order
+        self.leaf_start = torch.cumsum(count, dim=0) - count
+        for parent, child in zip(keys, keys[1:]):
+            self.child_start.append(torch.searchsorted(child >> 2, parent))
+            self.child_end.append(torch.searchsorted(child >> 2, parent, right=True))
+
+    def cellsize(self, level: int) -> float:
+        return self.side / 2**level
+
+
+def _interact(force: torch.Tensor, body: torch.Tensor, vec: torch.Tensor, dist: torch.Tensor,
+              mass: torch.Tensor, laws: Iterable[physics.GravityLaw]):
+    far = dist > 0
+    body, vec, dist, mass = body[far], vec[far], dist[far], mass[far]
+    k = torch.zeros_like(dist)
+    for coefficient, power in laws:    # vec's norm is not 1, so must +1 to power
+        k += coefficient * mass / dist**(power+1)
+    force.index_add_(0, body, k[:, None] * vec)
+
+
+def force(pos: torch.Tensor, laws: Iterable[physics.GravityLaw], theta: float = None,
+          depth: int = None, chunk: int = None) -> torch.Tensor:
+    """
+    get the sum of gravity which each node receive by Barnes-Hut approximation.
+    O(n log n) in torch, all laws are evaluated in one tree traversal.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2)
+        laws {Iterable[physics.GravityLaw]} -- (coefficient, power) of each gravity.
+                                       negative coefficient means repultion.
+
+    Keyword Arguments:
+        theta {float} -- opening angle. the cell of size s at distance d is regarded as
+                         a point mass if s/d < theta, 0 is exact. (default: {rc.barnes_hut_theta})
+        depth {int} -- max depth of quadtree (default: {rc.barnes_hut_depth})
+        chunk {int} -- the number of nodes traversing the tree at once (default: {rc.barnes_hut_chunk})
+
+    Returns:
+        torch.Tensor -- force array (n*2), same as the sum of physics.gravity over dim=1.
+    """
+    laws = list(laws)
+    theta = rc.barnes_hut_theta if theta is None else theta
+    chunk = chunk or rc.barnes_hut_chunk
+    result = torch.zeros_like(pos)
+    if len(pos) < 2:
+        return result
+    tree = QuadTree(pos, depth)
+    for start in range(0, len(pos), chunk):
+        _traverse(tree, pos, torch.arange(start, min(start + chunk, len(pos)),
+                                          device=pos.device), laws, theta, result)
+    return result
+
+
+def _traverse(tree: QuadTree, pos: torch.Tensor, bodies: torch.Tensor,
+              laws: List[physics.GravityLaw], theta: float, result: torch.Tensor):
+    body = bodies
+    cell = torch.zeros_like(bodies)     # every body start from the root
+    for level in range(tree.depth + 1):
+        mass, com = tree.mass[level][cell], tree.com[level][cell]
+        inside = tree.cell[level][body] == cell
+        if level == tree.depth:     # leaves can't be opened, interact with each body in them
+            count = tree.mass[level][cell].long()
+            pair = torch.repeat_interleave(torch.arange(len(body), device=pos.device), count)
+            first = torch.cumsum(count, dim=0) - count
+            other = tree.order[tree.leaf_start[cell][pair]
+                               + torch.arange(len(pair), device=pos.device) - first[pair]]
+            body = body[pair]
+            vec = pos[other] - pos[body]    # the body itself is at distance 0, so ignored
+            _interact(result, body, vec, torch.norm(vec, dim=-1), torch.ones_like(vec[:, 0]), laws)
+            return
+        vec = com - pos[body]
+        dist = torch.norm(vec, dim=-1)
+        accept = ~inside & ((mass == 1) | (tree.cellsize(level) < theta * dist))
+        _interact(result, body[accept], vec[accept], dist[accept], mass[accept], laws)
+        body, cell = body[~accept], cell[~accept]
+        start = tree.child_start[level][cell]
+        count = tree.child_end[level][cell] - start
+        pair = torch.repeat_interleave(torch.arange(len(body), device=pos.device), count)
+        first = torch.cumsum(count, dim=0) - count
+        cell = start[pair] + torch.arange(len(pair), device=pos.device) - first[pair]
+        body = body[pair]
+        if len(body) == 0:
+            return
+
+
+def exact_force(pos: torch.Tensor, laws: Iterable[physics.GravityLaw],
+                sample: torch.Tensor = None) -> torch.Tensor:
+    """
+    get the exact sum of gravity by all pairs. O(n*len(sample)) in torch.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2)
+        laws {Iterable[physics.GravityLaw]} -- (coefficient, power) of each gravity.
+
+    Keyword Arguments:
+        sample {torch.Tensor} -- index of nodes which receive the force (default: {all nodes})
+
+    Returns:
+        torch.Tensor -- force array (len(sample)*2)
+    """
+    target = pos if sample is None else pos[sample]
+    vec = pos[None, :, :] - target[:, None, :]
+    dist = torch.norm(vec, dim=-1)
+    k = torch.zeros_like(dist)
+    for coefficient, power in laws:
+        k += coefficient / dist**(power+1)
+    k[dist == 0] = 0
+    return torch.sum(k[:, :, None] * vec, dim=1)
+
+
+def error_report(pos: torch.Tensor, laws: Iterable[physics.GravityLaw], theta: float = None,
+                 depth: int = None, sample: int = None) -> Dict[str, float]:
+    """
+    compare Barnes-Hut approximation with exact kernel.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2)
+        laws {Iterable[physics.GravityLaw]} -- (coefficient, power) of each gravity.
+
+    Keyword Arguments:
+        theta {float} -- opening angle (default: {rc.barnes_hut_theta})
+        depth {int} -- max depth of quadtree (default: {rc.barnes_hut_depth})
+        sample {int} -- the number of nodes compared, for large n (default: {all nodes})
+
+    Returns:
+        Dict[str, float] -- relative error |approx - exact| / |exact| of each node's force
+    """
+    laws = list(laws)
+    index = None
+    if sample is not None and sample < len(pos):
+        index = torch.randperm(len(pos), device=pos.device)[:sample]
+    approx = force(pos, laws, theta=theta, depth=depth)
+    approx = approx if index is None else approx[index]
+    exact = exact_force(pos, laws, index)
+    error = torch.norm(approx - exact, dim=-1)
+    relative = error / torch.norm(exact, dim=-1).clamp(min=torch.finfo(pos.dtype).tiny)
+    return {'theta': rc.barnes_hut_theta if theta is None else theta,
+            'compared': len(exact),
+            'max_relative_error': relative.max().item(),
+            'mean_relative_error': relative.mean().item(),
+            'rms_relative_error': torch.sqrt(torch.mean(relative**2)).item(),
+            'max_absolute_error': error.max().item()}
+
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import List
+
+import torch
+
+from dgas import rc
+from dgas.manet import physics, field, connectivity
+
+
+class BatchColliderList:
+    '''
+    colliders of B independent replicas of n nodes, whose pos and vel are (B*n*2).
+    all replicas are linked and moved in one call, by dense pairs of each replica.
+    '''
+
+    def __init__(self, size: rc.Number, com_rad: rc.Number, pos: torch.Tensor, vel: torch.Tensor):
+        self.size = float(size)
+        self.com_rad = float(com_rad)
+        self.pos = pos.to(dtype=torch.float, device=rc.device)
+        self.vel = vel.to(dtype=torch.float, device=rc.device)
+
+    def __len__(self) -> int:
+        return self.pos.shape[1]
+
+    @property
+    def batch(self) -> int:
+        return self.pos.shape[0]
+
+    def edge_index(self) -> torch.Tensor:
+        '''
+        linked triples (E*3) of (replica, u, v), sorted lexicographically and u < v.
+        '''
+        dist = torch.norm(physics.difference(self.pos), dim=-1)
+        return torch.nonzero(torch.triu(dist < self.com_rad, diagonal=1))
+
+    def update(self, t: rc.GlobalTime):
+        self.pos += self.vel
+        vec = physics.difference(self.pos)
+        dist = torch.norm(vec, dim=-1)
+        attraction = physics.gravity(self.pos, rc.attraction_coefficient,
+                                     rc.attraction_power, vec_ij=vec, dist=dist)
+        repultion = -physics.gravity(self.pos, rc.repultion_coefficient,
+                                     rc.repultion_power, vec_ij=vec, dist=dist)
+        self.vel += torch.sum(attraction, dim=-2) + torch.sum(repultion, dim=-2)
+
+
+class BatchGravityField(field.GravityField):
+    '''
+    GravityField of B replicas without graph and node instances.
+    node i of replica b is node b*n+i of the disjoint union of replicas,
+    edges and connectivity tracker are of the union, and connectivity is (B*1) of each replica.
+    '''
+
+    def __init__(self, colliders: BatchColliderList, xlen: rc.Number, ylen: rc.Number,
+                 origin=(0, 0)):
+        # no graph, so GravityField.__init__ is not called
+        self.graph = None
+        self.nodes: List = []
+        self.colliders = colliders
+        self.xlen = xlen
+        self.ylen = ylen
+        self.origin = torch.tensor(origin, dtype=torch.float, device=rc.device)
+        self.n, self.batch = len(colliders), colliders.batch
+        self.connectivity = torch.ones(self.batch, dtype=torch.bool, device=rc.device)
+        self.edge_keys = torch.zeros(0, dtype=torch.long, device=rc.device)
+        self.removed_index: torch.Tensor = None
+        self.added_index: torch.Tensor = None
+        self.tracker = connectivity.ConnectivityTracker(self.batch * self.n)
+        self.update_edge(-1)
+
+    def directed_edge_index(self) -> torch.Tensor:
+        '''
+        edges of the union (2E*2) of both direction, linked at the last update_edge().
+        '''
+        size = self.batch * self.n
+        index = torch.stack((self.edge_keys // size, self.edge_keys % size), dim=1)
+        return torch.cat((index, index.flip(1)))
+
+    def update(self, t: rc.GlobalTime):
+        self.update_edge(t)
+        self.update_colliders(t)
+        self.connectivity = torch.tensor([len(self.tracker.component_of(b * self.n)) == self.n
+                                          for b in range(self.batch)], device=rc.device)
+
+    def update_edge(self, t: rc.GlobalTime):
+        '''
+        same as GravityField.update_edge() with keys of the union, the graph is not kept.
+        '''
+        size = self.batch * self.n
+        index = self.colliders.edge_index()
+        u, v = index[:, 0] * self.n + index[:, 1], index[:, 0] * self.n + index[:, 2]
+        prev, new = self.edge_keys, u * size + v
+        removed, added = ~torch.isin(prev, new), ~torch.isin(new, prev)
+        self.edge_keys = new
+        self.removed_index = torch.stack((prev[removed] // size, prev[removed] % size), dim=1)
+        self.added_index = torch.stack((u[added], v[added]), dim=1)
+        self.tracker.update(self.added_index.tolist(), self.removed_index.tolist())
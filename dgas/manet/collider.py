@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Union, Iterable, Tuple, List
+from typing import Union, Iterable, Tuple, List, Callable
 from collections import abc
 import itertools
 
@@ -7,7 +7,102 @@ import torch
 from scipy.sparse import csr_matrix
 
 from dgas import rc
-from dgas.manet import physics
+from dgas.manet import physics, barneshut
+
+
+class Geometry:
+    '''
+    pairwise quantities of the positions shared by all consumers in a frame.
+    they are computed at most once, until invalidate() is called. NodeColliderList calls it
+    when pos is assigned (also by +=), so call it if pos is modified in place otherwise.
+    '''
+
+    def __init__(self, colliders: NodeColliderList):
+        self.colliders = colliders
+        self._cache = {}
+
+    def invalidate(self):
+        self._cache.clear()
+
+    def _cached(self, key, compute: Callable[[], torch.Tensor]) -> torch.Tensor:
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def difference(self) -> torch.Tensor:
+        '''
+        difference[i, j] is pos[j] - pos[i] (n*n*2).
+        '''
+        return self._cached('difference', lambda: physics.difference(self.colliders.pos))
+
+    def distance(self) -> torch.Tensor:
+        '''
+        distance[i, j] is |pos[j] - pos[i]| (n*n).
+        '''
+        return self._cached('distance', lambda: torch.norm(self.difference(), dim=-1))
+
+    def direction(self) -> torch.Tensor:
+        '''
+        direction[i, j] is the unit vector from pos[i] to pos[j], or 0 if same position (n*n*2).
+        '''
+        def compute():
+            dist = self.distance()[:, :, None]
+            return torch.where(dist > 0, self.difference() / dist, torch.zeros_like(dist))
+        return self._cached('direction', compute)
+
+    def linked(self) -> torch.Tensor:
+        '''
+        linked[i, j] is whether distance is less than communication radius (n*n bool).
+        '''
+        return self._cached('linked', lambda: self.distance() < self.colliders.com_rad)
+
+    def edge_index(self) -> torch.Tensor:
+        '''
+        see NodeColliderList.edge_index().
+        '''
+        return self._cached(('edge_index', rc.neighbor_search), self.colliders._edge_index)
+
+
+class VerletList:
+    '''
+    candidate pairs within communication radius + skin.
+    each frame only candidates are checked, and candidates are rebuilt by cell list
+    only when some node moves more than skin/2 since the last build.
+    '''
+
+    def __init__(self, colliders: NodeColliderList, skin: rc.Number = None):
+        self.colliders = colliders
+        self.skin = rc.verlet_skin if skin is None else skin
+        self.candidates: torch.Tensor = None
+        self.reference: torch.Tensor = None
+        self.rebuilds = 0
+
+    def expired(self) -> bool:
+        pos = self.colliders.pos
+        if self.reference is None or self.reference.shape != pos.shape:
+            return True
+        displacement = torch.norm(pos - self.reference, dim=-1)
+        return bool(displacement.max() > self.skin / 2)
+
+    def rebuild(self):
+        pos = self.colliders.pos
+        self.candidates = physics.neighbor_pairs(pos, self.colliders.com_rad + self.skin)
+        self.reference = pos.clone()
+        self.rebuilds += 1
+
+    def edge_index(self) -> torch.Tensor:
+        '''
+        O(n + candidates) unless rebuild.
+        '''
+        if self.expired():
+            self.rebuild()
+        pos, com_rad = self.colliders.pos, self.colliders.com_rad
+        u, v = self.candidates.T
+        dist = torch.norm(pos[u] - pos[v], dim=-1)
+        if isinstance(com_rad, torch.Tensor):
+            return self.candidates[dist < torch.maximum(com_rad[u], com_rad[v])]
+        else:
+            return self.candidates[dist < com_rad]
 
 
 class NodeColliderList:
@@ -17,10 +112,21 @@ class NodeColliderList:
             size, abc.Iterable) else float(size)
         self.com_rad = torch.tensor(list(com_rad), dtype=torch.float, device=rc.device) if isinstance(
             com_rad, abc.Iterable) else float(com_rad)
+        self.geometry = Geometry(self)
         self.pos = torch.tensor(list([x, y]for x, y in pos),
                                 dtype=torch.float, device=rc.device)
         self.vel = torch.tensor(list([vx, vy]for vx, vy in vel),
                                 dtype=torch.float, device=rc.device)
+        self.verlet = VerletList(self)
+
+    @property
+    def pos(self) -> torch.Tensor:
+        return self._pos
+
+    @pos.setter
+    def pos(self, pos: torch.Tensor):
+        self._pos = pos
+        self.geometry.invalidate()
 
     def __len__(self) -> int:
         return len(self.pos)
@@ -35,30 +141,83 @@ class NodeColliderList:
         else:
             return self.size[key], self.pos[key], self.vel[key]
 
-    def adjacency_matrix(self, distweight=False) -> torch.Tensor:
-        dist = physics.distance(self.pos)
+    def edge_index(self) -> torch.Tensor:
+        '''
+        linked pairs (E*2), sorted lexicographically and pairs[k, 0] < pairs[k, 1].
+        rc.neighbor_search choose all pairs distance (dense), streaming blocks of it (tiled),
+        uniform grid (cell) or candidates of it (verlet). cached while positions are not changed.
+        '''
+        return self.geometry.edge_index()
+
+    def _edge_index(self) -> torch.Tensor:
+        if rc.neighbor_search == rc.neighbor_search_dense:
+            linked = self.geometry.linked()
+            return torch.stack(torch.where(torch.triu(linked | linked.T, diagonal=1))).T
+        elif rc.neighbor_search == rc.neighbor_search_tiled:
+            return physics.tiled_neighbor_pairs(self.pos, self.com_rad)
+        elif rc.neighbor_search == rc.neighbor_search_verlet:
+            return self.verlet.edge_index()
+        else:
+            return physics.neighbor_pairs(self.pos, self.com_rad)
+
+    def directed_edge_index(self, selfloop=False) -> torch.Tensor:
+        '''
+        linked pairs (2E*2) of both direction, sorted lexicographically.
+        '''
+        edge = self.edge_index()
+        loop = torch.arange(len(self), device=edge.device)[:, None].repeat(1, 2)
+        edge = torch.cat((edge, edge.flip(1)) + ((loop,) if selfloop else ()))
+        return edge[torch.argsort(edge[:, 0] * len(self) + edge[:, 1])]
+
+    def adjacency_matrix(self, distweight=False, sparse=False) -> torch.Tensor:
+        '''
+        if sparse, return sparse coo tensor without diagonal element.
+        '''
+        n = len(self)
+        if rc.neighbor_search == rc.neighbor_search_dense and not sparse:
+            dist = self.geometry.distance()
+            if distweight:
+                return torch.where(dist < self.com_rad, dist, torch.zeros_like(dist))
+            else:
+                return torch.where(dist < self.com_rad, torch.ones_like(dist), torch.zeros_like(dist))
+        u, v = self.directed_edge_index().T
         if distweight:
-            return torch.where(dist < self.com_rad, dist, torch.zeros_like(dist))
+            value = torch.norm(self.pos[u] - self.pos[v], dim=-1)
         else:
-            return torch.where(dist < self.com_rad, torch.ones_like(dist), torch.zeros_like(dist))
+            value = torch.ones(len(u), dtype=torch.float, device=rc.device)
+        if sparse:
+            return torch.sparse_coo_tensor(torch.stack((u, v)), value, (n, n),
+                                           check_invariants=False).coalesce()
+        adjacency = torch.zeros((n, n), dtype=torch.float, device=rc.device)
+        adjacency[u, v] = value
+        if not distweight:
+            adjacency.fill_diagonal_(1)
+        return adjacency
 
     def adjacency_list(self) -> List[List[int]]:
-        edge = torch.stack(torch.where(
-            physics.distance(self.pos) < self.com_rad)).T
-        return [list(t[1].item() for t in v) for _i, v in itertools.groupby(edge, key=lambda e: e[0])]
+        u, v = self.directed_edge_index(selfloop=True).T
+        return [nei.tolist() for nei in v.split(torch.bincount(u, minlength=len(self)).tolist())]
 
     def edge_list(self, distweight=False) -> List[Tuple[int, int]]:
-        dist = physics.distance(self.pos)
-        edge = torch.stack(torch.where(dist < self.com_rad)).T
+        edge = self.directed_edge_index(selfloop=True)
         if distweight:
-            return [(u, v, dist[u, v]) for u, v in edge.tolist()]
+            u, v = edge.T
+            dist = torch.norm(self.pos[u] - self.pos[v], dim=-1)
+            return [(u, v, d) for (u, v), d in zip(edge.tolist(), dist.tolist())]
         else:
             return [(u, v) for u, v in edge.tolist()]
 
     def update(self, t: rc.GlobalTime):
         self.pos += self.vel
+        if rc.gravity_solver == rc.gravity_solver_barnes_hut:
+            self.vel += barneshut.force(self.pos, physics.mobility_laws())
+            return
+        elif rc.gravity_solver == rc.gravity_solver_tiled:
+            self.vel += physics.tiled_gravity(self.pos, physics.mobility_laws())
+            return
+        vec, dist = self.geometry.difference(), self.geometry.distance()
         attraction = physics.gravity(self.pos, rc.attraction_coefficient,
-                                     rc.attraction_power)
+                                     rc.attraction_power, vec_ij=vec, dist=dist)
         repultion = -physics.gravity(self.pos, rc.repultion_coefficient,
-                                     rc.repultion_power)
+                                     rc.repultion_power, vec_ij=vec, dist=dist)
         self.vel += torch.sum(attraction, dim=1) + torch.sum(repultion, dim=1)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+from typing import Iterable, Tuple, List, Dict, Set
+
+
+class ConnectivityTracker:
+    '''
+    connected components of a dynamic graph, driven by added/removed edge deltas.
+    added edges merge components by size (union-find with relabeling the smaller),
+    and a removed edge runs a search alternating from both endpoints,
+    which stops when they meet or the smaller side is exhausted.
+    '''
+
+    def __init__(self, n: int):
+        self.adjacency: List[Set[int]] = [set() for _ in range(n)]
+        self.component: List[int] = list(range(n))
+        self.members: Dict[int, Set[int]] = {i: {i} for i in range(n)}
+        self._label = n
+
+    def __len__(self) -> int:
+        return len(self.adjacency)
+
+    def connected(self) -> bool:
+        return len(self.members) <= 1
+
+    def number_of_components(self) -> int:
+        return len(self.members)
+
+    def component_sizes(self) -> List[int]:
+        '''
+        sizes of all components in descending order.
+        '''
+        return sorted((len(m) for m in self.members.values()), reverse=True)
+
+    def component_of(self, u: int) -> Set[int]:
+        return self.members[self.component[u]]
+
+    def update(self, added: Iterable[Tuple[int, int]], removed: Iterable[Tuple[int, int]]):
+        '''
+        apply one frame's delta. removed edges are processed one by one before added edges,
+        so that components are exact after each step.
+        '''
+        for u, v in removed:
+            self.remove_edge(u, v)
+        for u, v in added:
+            self.add_edge(u, v)
+
+    def add_edge(self, u: int, v: int):
+        self.adjacency[u].add(v)
+        self.adjacency[v].add(u)
+        cu, cv = self.component[u], self.component[v]
+        if cu == cv:
+            return
+        if len(self.members[cu]) < len(self.members[cv]):
+            cu, cv = cv, cu
+        small = self.members.pop(cv)
+        for w in small:
+            self.component[w] = cu
+        self.members[cu] |= small
+
+    def remove_edge(self, u: int, v: int):
+        self.adjacency[u].discard(v)
+        self.adjacency[v].discard(u)
+        split = self._separated(u, v)
+        if split is None:
+            return
+        label, self._label = self._label, self._label + 1
+        self.members[self.component[u]] -= split
+        for w in split:
+            self.component[w] = label
+        self.members[label] = split
+
+    def _separated(self, u: int, v: int) -> Set[int]:
+        '''
+        None if u and v are still connected, else the smaller side found.
+        '''
+        seen = ({u}, {v})
+        queue = ([u], [v])
+        side = 0
+        while queue[0] and queue[1]:
+            w = queue[side].pop()
+            for x in self.adjacency[w]:
+                if x in seen[1 - side]:
+                    return None
+                if x not in seen[side]:
+                    seen[side].add(x)
+                    queue[side].append(x)
+            side = 1 - side
+        return seen[0] if not queue[0] else seen[1]
@@ -1,32 +1,45 @@
 from __future__ import annotations
-from typing import Tuple, Type, Dict
+from typing import Tuple, Type, Dict, List
 
 import torch
 import numpy as np
 from scipy.sparse import csgraph, csr_matrix
 import networkx as nx
 
-from dgas import rc, node, edge, message, graph, result
-from dgas.manet import collider, physics
+from dgas import rc, node, edge, message, graph, result, stream
+from dgas.manet import collider, physics, connectivity, trajectory
 
 
 def init_random(n: int, xlen: rc.Number, ylen: rc.Number,
                 node_class: Type[node.Node] = None,
-                field_class: Type[Field] = None, identifier=True):
-    g = graph.make_graph(rc.undirected_graph)
-    nodes, pos, vel = [], [], []
+                field_class: Type[Field] = None, identifier=True, **kwargs):
+    '''
+    kwargs are passed to field_class.
+    '''
+    pos, vel = [], []
     for i in range(n):
         # TODO 初期状況で連結でない場合
-        node = (node_class or node.Node)(g, i if identifier else None)
         pos.append((torch.rand(2) * torch.tensor([xlen, ylen])).tolist())
         vel.append((rc.rand_node_vel_min + (rc.rand_node_vel_max -
                                             rc.rand_node_vel_min) * torch.rand(2)).tolist())
-        nodes.append(node)
-    g.add_nodes_from((node, {rc.collider_index_key: i})
-                     for i, node in enumerate(nodes))
+    return init_field(pos, vel, xlen, ylen, node_class, field_class, identifier, **kwargs)
+
+
+def init_field(pos: List[Tuple[rc.Number, rc.Number]], vel: List[Tuple[rc.Number, rc.Number]],
+               xlen: rc.Number, ylen: rc.Number,
+               node_class: Type[node.Node] = None,
+               field_class: Type[Field] = None, identifier=True, **kwargs):
+    '''
+    field of given initial state, node i is collider i. kwargs are passed to field_class.
+    '''
+    g = graph.make_graph(rc.field_graph)
+    nodes = [(node_class or node.Node)(g, i if identifier else None) for i in range(len(pos))]
+    g.add_nodes_from((nod, {rc.collider_index_key: i})
+                     for i, nod in enumerate(nodes))
     colliders = collider.NodeColliderList(
         rc.manet_node_size, rc.communication_radius, pos, vel)
-    return (field_class or GravityField)(g, colliders, xlen, ylen, origin=(0, 0), nodelist=nodes)
+    return (field_class or GravityField)(g, colliders, xlen, ylen, origin=(0, 0), nodelist=nodes,
+                                         **kwargs)
 
 
 class Field:
@@ -40,6 +53,7 @@ class Field:
         self.ylen = ylen
         self.origin = torch.tensor(origin, dtype=torch.float, device=rc.device)
         self.connectivity = True
+        self.tracker: connectivity.ConnectivityTracker = None
 
     @property
     def north(self) -> rc.Number:
@@ -106,7 +120,8 @@ class Field:
         return vec * torch.tensor([1, 0], dtype=torch.float, device=rc.device)
 
     def pos_dict(self) -> Dict[node.Node, np.ndarray]:
-        return {n: self.colliders.pos[i].cpu().numpy() for n, i in self.graph.nodes(rc.collider_index_key)}
+        pos = self.colliders.pos.cpu().numpy()
+        return {n: pos[i] for n, i in self.graph.nodes(rc.collider_index_key)}
 
     def node_index(self) -> Dict[node.Node, int]:
         return {n: i for n, i in self.graph.nodes(rc.collider_index_key)}
@@ -114,10 +129,10 @@ class Field:
     def force_in_field(self, refrect=True) -> Tuple[torch.Tensor, torch.Tensor]:
         size, pos, vel = self.colliders.size, self.colliders.pos, self.colliders.vel
         center = (self.southwest + self.northeast) / 2
-        north_out = (pos + self.north_extract(size))[:, 1] > self.north
-        south_out = (pos + self.south_extract(size))[:, 1] < self.south
-        west_out = (pos + self.west_extract(size))[:, 0] < self.west
-        east_out = (pos + self.east_extract(size))[:, 0] > self.east
+        north_out = (pos + self.north_extract(size))[..., 1] > self.north
+        south_out = (pos + self.south_extract(size))[..., 1] < self.south
+        west_out = (pos + self.west_extract(size))[..., 0] < self.west
+        east_out = (pos + self.east_extract(size))[..., 0] > self.east
         if refrect:
             rev_x = torch.tensor([-1, 1], dtype=torch.float, device=rc.device)
             rev_y = torch.tensor([1, -1], dtype=torch.float, device=rc.device)
@@ -138,11 +153,14 @@ class Field:
     def clamp_velocity(self, min=None, max=None):
         abs_vel = torch.norm(self.colliders.vel, dim=-1)
         clamped = torch.clamp(abs_vel, min or 0, max or float('inf'))
-        return (clamped / abs_vel)[:, None] * self.colliders.vel
+        return (clamped / abs_vel)[..., None] * self.colliders.vel
 
     def update(self, t: rc.GlobalTime):
         self.update_colliders(t)
-        self.connectivity = nx.is_connected(self.graph)
+        if self.tracker is not None:
+            self.connectivity = self.tracker.connected()
+        else:
+            self.connectivity = nx.is_connected(graph.networkx_view(self.graph))
 
     def update_colliders(self, t: rc.GlobalTime):
         self.colliders.pos, self.colliders.vel = self.force_in_field(
@@ -155,10 +173,14 @@ class GravityField(Field):
     def __init__(self, g: graph.GraphType, colliders: collider.NodeColliderList,
                  xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
         super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
-        self.edges = torch.zeros((len(self.nodes), len(self.nodes)),
-                                 dtype=torch.float, device=rc.device)
-        self.removed_edges = None
-        self.added_edges = None
+        self.edge_keys = torch.zeros(0, dtype=torch.long, device=rc.device)
+        self.removed_index: torch.Tensor = None
+        self.added_index: torch.Tensor = None
+        self.added_data: List[edge.EdgeData] = None
+        self.graph_index = None
+        if isinstance(g, graph.UndirectedCsrGraph):
+            self.graph_index = np.array([g.index(n) for n in self.nodes], dtype=np.int64)
+        self.tracker = connectivity.ConnectivityTracker(len(self.nodes))
         self.update_edge(-1)    # make networkx edge
 
     def wall_repultion(self, coefficient=1.0, power=2) -> torch.Tensor:
@@ -173,6 +195,25 @@ class GravityField(Field):
                                           coefficient, power)
         return north + south + west + east
 
+    @property
+    def removed_edges(self) -> List[Tuple[node.Node, node.Node]]:
+        nodes = self.nodes
+        return [(nodes[u], nodes[v]) for u, v in self.removed_index.tolist()]
+
+    @property
+    def added_edges(self) -> List[Tuple[node.Node, node.Node, Dict[str, edge.EdgeData]]]:
+        nodes = self.nodes
+        return [(nodes[u], nodes[v], {rc.edge_key: data}) for (u, v), data
+                in zip(self.added_index.tolist(), self.added_data)]
+
+    def directed_edge_index(self) -> torch.Tensor:
+        '''
+        edges of the graph (2E*2) of both direction, linked at the last update_edge().
+        '''
+        n = len(self.nodes)
+        index = torch.stack((self.edge_keys // n, self.edge_keys % n), dim=1)
+        return torch.cat((index, index.flip(1)))
+
     def update(self, t: rc.GlobalTime):
         self.update_edge(t)
         super().update(t)
@@ -184,14 +225,46 @@ class GravityField(Field):
         self.colliders.update(t)
 
     def update_edge(self, t: rc.GlobalTime):
-        prev, new = self.edges, self.colliders.adjacency_matrix()
-        self.edges, diff = new, new - prev
-        self.removed_edges = [(self.nodes[u], self.nodes[v]) for u, v
-                              in zip(*torch.where(diff < 0)) if u != v]
-        self.graph.remove_edges_from(self.removed_edges)
-        self.added_edges = [(self.nodes[u], self.nodes[v], {rc.edge_key: edge.EdgeData(
-            rc.edge_weight)}) for u, v in zip(*torch.where(diff > 0)) if u != v]
-        self.graph.add_edges_from(self.added_edges)
+        '''
+        edges are kept as sorted keys u*n+v (u < v), and diffed by vectorized set operation.
+        added_index and removed_index are unique undirected pairs (k*2) of collider index.
+        '''
+        self.apply_edge_delta(*self.edge_delta(t))
+
+    def edge_delta(self, t: rc.GlobalTime) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        '''
+        (new edge keys, removed_index, added_index) of frame t by link detection.
+        '''
+        n = len(self.nodes)
+        index = self.colliders.edge_index()
+        prev, new = self.edge_keys, index[:, 0] * n + index[:, 1]
+        removed, added = ~torch.isin(prev, new), ~torch.isin(new, prev)
+        return new, torch.stack((prev[removed] // n, prev[removed] % n), dim=1), index[added]
+
+    def apply_edge_delta(self, keys: torch.Tensor, removed_index: torch.Tensor,
+                         added_index: torch.Tensor):
+        self.edge_keys = keys
+        self.removed_index = removed_index
+        self.added_index = added_index
+        removed, added = self.removed_index.tolist(), self.added_index.tolist()
+        if rc.headless:
+            self.added_data = [edge.flyweight(rc.edge_weight)] * len(added)
+        else:
+            self.added_data = [edge.EdgeData(rc.edge_weight) for _ in added]
+        if self.graph_index is not None:    # array-backed graph, no node lookup
+            removed_np, added_np = self.removed_index.cpu().numpy(), self.added_index.cpu().numpy()
+            self.graph.remove_index_edges(self.graph_index[removed_np[:, 0]],
+                                          self.graph_index[removed_np[:, 1]])
+            self.graph.add_index_edges(self.graph_index[added_np[:, 0]],
+                                       self.graph_index[added_np[:, 1]],
+                                       {rc.edge_key: self.added_data})
+        else:
+            self.graph.remove_edges_from(self.removed_edges)
+            self.graph.add_edges_from(self.added_edges)
+        self.tracker.update(added, removed)
+        nodes = self.nodes
+        for i in torch.unique(torch.cat((self.removed_index, self.added_index)).flatten()).tolist():
+            nodes[i].invalidate_neighbors()
 
 
 class LoggingGravityField(GravityField):
@@ -199,16 +272,52 @@ class LoggingGravityField(GravityField):
                  xlen: rc.Number, ylen: rc.Number, origin=(0, 0), nodelist=None):
         super().__init__(g, colliders, xlen, ylen, origin=origin, nodelist=nodelist)
         self.record = result.FieldRecord()
+        self.trajectory: trajectory.TrajectoryRecorder = None
+        if rc.trajectory_format == rc.trajectory_format_npy:
+            self.trajectory = trajectory.TrajectoryRecorder(len(self.nodes), (xlen, ylen))
+        self.edges: trajectory.EdgeRecorder = None     # with trajectory, for offline rendering
+        if self.trajectory is not None:
+            self.edges = trajectory.EdgeRecorder(len(self.nodes))
+            self.edges.append(-1, self.added_index, self.removed_index)    # linked at first
+        self.frames: stream.NdjsonWriter = None
+        if rc.result_format == rc.result_format_ndjson:
+            self.frames = stream.NdjsonWriter()
 
     def update(self, t: rc.GlobalTime):
-        self.record.pos.append(self.colliders.pos.tolist())
-        self.record.connectivity.append(self.connectivity)
+        if self.frames is not None:
+            line = {rc.key_frame_log: t, rc.key_connectivity_log: self.connectivity}
+            if self.trajectory is None:
+                line[rc.key_pos_log] = self.colliders.pos.tolist()
+            self.frames.append(line)
+        else:
+            if self.trajectory is None:
+                self.record.pos.append(self.colliders.pos.tolist())
+            self.record.connectivity.append(self.connectivity)
+        if self.trajectory is not None:
+            self.trajectory.append(self.colliders.pos)
+        self.record.connected = self.record.connected and bool(self.connectivity)
         super().update(t)
 
+    def discard_streams(self):
+        '''
+        remove trajectory, edges and frames files of a run which is not saved.
+        '''
+        if self.trajectory is not None:
+            self.trajectory.discard()
+            self.edges.discard()
+        if self.frames is not None:
+            self.frames.discard()
+
     def update_edge(self, t: rc.GlobalTime):
+        '''
+        edges are recorded as directed pairs (both direction of each link), same as the results
+        saved when links were diffed as adjacency matrix.
+        '''
         if t == 0:
-            self.record.first_edges = len(self.added_edges)
+            self.record.first_edges = 2 * len(self.added_index)
         super().update_edge(t)
         if t >= 0:
-            self.record.added_edges += len(self.added_edges)
-            self.record.removed_edges += len(self.removed_edges)
+            self.record.added_edges += 2 * len(self.added_index)
+            self.record.removed_edges += 2 * len(self.removed_index)
+            if self.edges is not None:
+                self.edges.append(t, self.added_index, self.removed_index)
@@ -1,10 +1,25 @@
 from __future__ import annotations
-from typing import Union, Iterable, Tuple
+from typing import Union, Iterable, Tuple, List
 
 import torch
 
 from dgas import rc
 
+GravityLaw = Tuple[float, float]    # (coefficient, power), negative coefficient is repultion
+
+
+def difference(pos: torch.Tensor) -> torch.Tensor:
+    """
+    get the difference of all pairs. O(n^2) in torch.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2), or (B*n*2) of B replicas
+
+    Returns:
+        torch.Tensor -- difference mat (n*n*2). mat[i, j] is pos[j] - pos[i].
+    """
+    return pos[..., None, :, :] - pos[..., :, None, :]
+
 
 def distance(pos: torch.Tensor) -> torch.Tensor:
     """
@@ -16,27 +31,175 @@ def distance(pos: torch.Tensor) -> torch.Tensor:
     Returns:
         torch.Tensor -- distance mat (n*n*2)
     """
-    return torch.norm(pos[None, :, :] - pos[:, None, :], dim=-1)
+    return torch.norm(difference(pos), dim=-1)
 
 
-def gravity(pos: torch.Tensor, coefficient=1.0, power=2) -> torch.Tensor:
+def neighbor_pairs(pos: torch.Tensor, radius: Union[float, torch.Tensor],
+                   cellsize: float = None) -> torch.Tensor:
     """
-    get the gravity of all pairs. O(n^2) in torch.
+    get the pairs whose distance is less than radius by uniform grid (cell list).
+    O(n + E) in torch, and never make n*n tensor.
 
     Arguments:
         pos {torch.Tensor} -- position array (n*2)
+        radius {Union[float, torch.Tensor]} -- threshold of distance, scalar or each node's (n*1).
+                                               if each node's, pair is linked by the larger one.
+
+    Keyword Arguments:
+        cellsize {float} -- side length of grid cell, must not be less than radius (default: {max radius})
+
+    Returns:
+        torch.Tensor -- pair array (E*2) sorted lexicographically. pairs[k, 0] < pairs[k, 1].
+    """
+    n = len(pos)
+    if n < 2:
+        return torch.zeros((0, 2), dtype=torch.long, device=pos.device)
+    cellsize = float(cellsize or (radius.max() if isinstance(radius, torch.Tensor) else radius))
+    if cellsize <= 0:
+        return torch.zeros((0, 2), dtype=torch.long, device=pos.device)
+    cell = torch.floor((pos - pos.min(dim=0).values) / cellsize).long() + 1
+    ncol = int(cell[:, 0].max()) + 2    # padding column, so neighbor cell never wrap
+    key, order = torch.sort(cell[:, 1] * ncol + cell[:, 0])
+    position = torch.arange(n, device=pos.device)
+    us, vs = [], []
+    for offset in (0, 1, ncol - 1, ncol, ncol + 1):     # half of the 3*3 stencil
+        target = key + offset
+        start = torch.searchsorted(key, target, right=False)
+        end = torch.searchsorted(key, target, right=True)
+        if offset == 0:     # in the same cell, only the following ones
+            start = position + 1
+        count = torch.clamp(end - start, min=0)
+        u = torch.repeat_interleave(position, count)
+        first = torch.cumsum(count, dim=0) - count
+        v = start[u] + torch.arange(len(u), device=pos.device) - first[u]
+        us.append(order[u])
+        vs.append(order[v])
+    u, v = torch.cat(us), torch.cat(vs)
+    u, v = torch.minimum(u, v), torch.maximum(u, v)
+    dist = torch.norm(pos[u] - pos[v], dim=-1)
+    if isinstance(radius, torch.Tensor):
+        linked = dist < torch.maximum(radius[u], radius[v])
+    else:
+        linked = dist < radius
+    u, v = u[linked], v[linked]
+    order = torch.argsort(u * n + v)
+    return torch.stack((u[order], v[order]), dim=1)
+
+
+def gravity(pos: torch.Tensor, coefficient=1.0, power=2,
+            vec_ij: torch.Tensor = None, dist: torch.Tensor = None) -> torch.Tensor:
+    """
+    get the gravity of all pairs. O(n^2) in torch.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2), or (B*n*2) of B replicas
 
     Keyword Arguments:
         coefficient {float} -- coefficient of gravity (default: {1.0})
         power {int} -- inversely proportional to the power of the distance (default: {2})
+        vec_ij {torch.Tensor} -- precomputed difference(pos) to be shared (default: {None})
+        dist {torch.Tensor} -- precomputed distance(pos) to be shared (default: {None})
 
     Returns:
         torch.Tensor -- gravity mat (n*n*2). mat[i, j] is force from j to i.
     """
-    vec_ij = pos[None, :, :] - pos[:, None, :]  # vec_ij 's norm is not 1,
-    k = coefficient / distance(pos)**(power+1)  # so must +1 to power
+    vec_ij = difference(pos) if vec_ij is None else vec_ij  # vec_ij 's norm is not 1,
+    dist = torch.norm(vec_ij, dim=-1) if dist is None else dist
+    k = coefficient / dist**(power+1)                       # so must +1 to power
     k[k == float('inf')] = 0
-    return k[:, :, None] * vec_ij     # gravity[i,j] = force from j to i
+    return k[..., None] * vec_ij      # gravity[i,j] = force from j to i
+
+
+def tiles(n: int, tile: int = None) -> Iterable[Tuple[int, int, int, int]]:
+    """
+    upper triangle blocks of n*n matrix.
+
+    Arguments:
+        n {int} -- size of matrix
+
+    Keyword Arguments:
+        tile {int} -- side length of block (default: {rc.pairwise_tile})
+
+    Returns:
+        Iterable[Tuple[int, int, int, int]] -- (row start, row end, column start, column end)
+    """
+    tile = tile or rc.pairwise_tile
+    for i in range(0, n, tile):
+        for j in range(i, n, tile):
+            yield i, min(i + tile, n), j, min(j + tile, n)
+
+
+def tiled_gravity(pos: torch.Tensor, laws: Iterable[GravityLaw], tile: int = None) -> torch.Tensor:
+    """
+    get the sum of gravity which each node receive, streaming over tiles.
+    O(n^2) time but O(tile^2) memory in torch, and each pair is computed once.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2)
+        laws {Iterable[GravityLaw]} -- (coefficient, power) of each gravity.
+                                       negative coefficient means repultion.
+
+    Keyword Arguments:
+        tile {int} -- side length of block (default: {rc.pairwise_tile})
+
+    Returns:
+        torch.Tensor -- force array (n*2), same as the sum of gravity() over dim=1.
+    """
+    laws = list(laws)
+    force = torch.zeros_like(pos)
+    for i0, i1, j0, j1 in tiles(len(pos), tile):
+        vec_ij = pos[None, j0:j1, :] - pos[i0:i1, None, :]
+        dist = torch.norm(vec_ij, dim=-1)
+        k = torch.zeros_like(dist)
+        for coefficient, power in laws:     # vec_ij 's norm is not 1, so must +1 to power
+            k += coefficient / dist**(power+1)
+        k[dist == 0] = 0
+        block = k[:, :, None] * vec_ij      # block[i,j] = force from j to i
+        force[i0:i1] += torch.sum(block, dim=1)
+        if i0 != j0:    # action and reaction
+            force[j0:j1] -= torch.sum(block, dim=0)
+    return force
+
+
+def tiled_neighbor_pairs(pos: torch.Tensor, radius: Union[float, torch.Tensor],
+                         tile: int = None) -> torch.Tensor:
+    """
+    get the pairs whose distance is less than radius, streaming over tiles.
+    O(n^2) time but O(tile^2 + E) memory in torch.
+
+    Arguments:
+        pos {torch.Tensor} -- position array (n*2)
+        radius {Union[float, torch.Tensor]} -- threshold of distance, scalar or each node's (n*1).
+                                               if each node's, pair is linked by the larger one.
+
+    Keyword Arguments:
+        tile {int} -- side length of block (default: {rc.pairwise_tile})
+
+    Returns:
+        torch.Tensor -- pair array (E*2) sorted lexicographically. pairs[k, 0] < pairs[k, 1].
+    """
+    n = len(pos)
+    pairs = [torch.zeros((0, 2), dtype=torch.long, device=pos.device)]
+    for i0, i1, j0, j1 in tiles(n, tile):
+        dist = torch.norm(pos[None, j0:j1, :] - pos[i0:i1, None, :], dim=-1)
+        if isinstance(radius, torch.Tensor):
+            linked = dist < torch.maximum(radius[i0:i1, None], radius[None, j0:j1])
+        else:
+            linked = dist < radius
+        if i0 == j0:
+            linked = torch.triu(linked, diagonal=1)
+        u, v = torch.where(linked)
+        pairs.append(torch.stack((u + i0, v + j0), dim=1))
+    pairs = torch.cat(pairs)
+    return pairs[torch.argsort(pairs[:, 0] * n + pairs[:, 1])]
+
+
+def mobility_laws() -> List[GravityLaw]:
+    """
+    attraction and repultion between nodes of gravity mobility model.
+    """
+    return [(rc.attraction_coefficient, rc.attraction_power),
+            (-rc.repultion_coefficient, rc.repultion_power)]
 
 
 def gravity_from_line(pos: torch.Tensor, p1: torch.Tensor, p2: torch.Tensor,
@@ -45,7 +208,7 @@ def gravity_from_line(pos: torch.Tensor, p1: torch.Tensor, p2: torch.Tensor,
     get the gravity from the line connecting p1 and p2.
 
     Arguments:
-        pos {torch.Tensor} -- position array (n*2)
+        pos {torch.Tensor} -- position array (n*2), or (B*n*2) of B replicas
         p1 {torch.Tensor} -- points where the line passes, but not p2.
         p2 {torch.Tensor} -- points where the line passes, but not p1.
 
@@ -59,7 +222,7 @@ def gravity_from_line(pos: torch.Tensor, p1: torch.Tensor, p2: torch.Tensor,
     u = ((p2 - p1) / torch.norm(p2 - p1))[None, :]
     posh = (pos - p1[None, :]) @ u.T * u + p1[None, :] - pos
     k = coefficient / torch.norm(posh, dim=-1)**(power+1)
-    return k[:, None] * posh    # posh 's norm is not 1, so must +1 to power
+    return k[..., None] * posh  # posh 's norm is not 1, so must +1 to power
 
 
 def to_unitvec(vec: torch.Tensor) -> torch.Tensor:
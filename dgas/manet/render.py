@@ -0,0 +1,243 @@
+from __future__ import annotations
+from typing import Tuple, Dict, List, Any, Sequence
+import glob
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from PIL import Image
+
+from dgas import rc, stream
+from dgas.manet import trajectory
+
+
+def load_result(resultdir: str, resulttype: str) -> Any:
+    '''
+    resulttype.json, or list of lines of resulttype.ndjson (gzipped or not) in resultdir.
+    '''
+    path = os.path.join(resultdir, resulttype + '.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    for compress in (False, True):
+        path = os.path.join(resultdir, stream.filename(resulttype, compress))
+        if os.path.exists(path):
+            return list(stream.read(path))
+    raise FileNotFoundError(f'no {resulttype} result in {resultdir}.')
+
+
+class RecordedRun:
+    '''
+    a saved result directory as arrays for rendering. frame k is the state at the start of
+    frame(k): positions from trajectory.npy, edges from the link deltas recorded with it in
+    edges.npy (edge colors are not recorded), colors of nodes by their first received frame,
+    and messages from received logs of nodes (only at node log level full),
+    drawn from their sended frame until their arrival.
+    runs without recorded edges (not saved with trajectory format npy) are not rendered, since
+    links linked again from positions differ from the simulation by quantize or com_rad of nodes.
+    '''
+
+    def __init__(self, resultdir: str, life: int = None):
+        self.life = max(rc.edge_weight if life is None else life, 1)
+        self.edges = trajectory.EdgeReader(recorded_edges(resultdir))
+        self.pos = trajectory.TrajectoryReader(os.path.join(resultdir, rc.trajectory_filename))
+        self.decimation = self.pos.decimation
+        nodes = load_result(resultdir, rc.key_nodes_result)
+        order = np.argsort([nod[rc.key_node_id_log] for nod in nodes])  # identifier is collider index
+        nodes = [nodes[i] for i in order]
+        self.root = np.array([nod[rc.key_node_id_log] == 0 for nod in nodes])
+        self.received_frame = np.array([self._first_received(nod) for nod in nodes], dtype=np.int64)
+        arrivals = [(nod[rc.key_node_id_log], log[rc.key_received_node_log], log[rc.key_received_frame_log])
+                    for nod in nodes for log in nod.get(rc.key_node_received_log, [])]
+        arrivals = np.array(arrivals, dtype=np.int64).reshape(-1, 3)
+        self.to_index, self.from_index, self.arrival = arrivals.T
+
+    @staticmethod
+    def _first_received(nod: Dict[str, Any]) -> rc.GlobalTime:
+        logs = nod.get(rc.key_node_received_log)
+        if logs is not None:
+            return min((log[rc.key_received_frame_log] for log in logs), default=-1)
+        return nod.get(rc.key_node_first_received_log, -1)
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    @property
+    def n(self) -> int:
+        return len(self.root)
+
+    def frame(self, k: int) -> rc.GlobalTime:
+        return k * self.decimation
+
+    def positions(self, k: int) -> np.ndarray:
+        return np.asarray(self.pos[k], dtype=np.float32)
+
+    def segments(self, pos: np.ndarray, t: rc.GlobalTime) -> np.ndarray:
+        '''
+        links at t as line segments (E*2*2) of pos.
+        '''
+        pairs = self.edges[t]
+        return pos[pairs] if len(pairs) else np.zeros((0, 2, 2), dtype=np.float32)
+
+    def colors(self, t: rc.GlobalTime) -> List[str]:
+        received = (self.received_frame >= 0) & (self.received_frame <= t)
+        return np.where(self.root, rc.root_color,
+                        np.where(received, rc.broadcasted_color, rc.node_color)).tolist()
+
+    def messages(self, pos: np.ndarray, t: rc.GlobalTime) -> np.ndarray:
+        '''
+        positions (M*2) of messages in flight at t, interpolated as message.progress().
+        '''
+        sended = self.arrival - self.life + 1   # as MessageTable, arrival is sended + life - 1
+        flying = (sended <= t) & (t < self.arrival)
+        sended = sended[flying]
+        progress = np.clip((t + 1 - sended) / self.life, 0.0, 1.0)[:, None]
+        frompos, topos = pos[self.from_index[flying]], pos[self.to_index[flying]]
+        return frompos + (topos - frompos) * progress
+
+
+def recorded_edges(resultdir: str) -> str:
+    '''
+    path of the edges file of resultdir, which must exist to render it.
+    '''
+    path = os.path.join(resultdir, rc.edges_filename)
+    if not os.path.exists(path):
+        raise ValueError(f'no {rc.edges_filename} in {resultdir}, '
+                         + 'save with trajectory format npy to render offline.')
+    return path
+
+
+def recorded_meta(resultdir: str) -> Tuple[int, Tuple[float, float]]:
+    '''
+    (number of recorded frames, extent of field) in trajectory.json, without loading the run.
+    '''
+    recorded_edges(resultdir)
+    with open(trajectory.meta_path(os.path.join(resultdir, rc.trajectory_filename))) as f:
+        meta = json.load(f)
+    return meta['frames'], tuple(meta['extent'])
+
+
+class RangeRenderer:
+    '''
+    a RecordedRun and the artists of a figure, created once for a process
+    and updated in place for each frame.
+    '''
+
+    def __init__(self, resultdir: str, options: Dict[str, Any]):
+        self.run = RecordedRun(resultdir, life=options['life'])
+        self.fig = Figure(figsize=options['figsize'], dpi=options['dpi'])
+        FigureCanvasAgg(self.fig)
+        axes = self.fig.add_subplot()
+        xlen, ylen = options['extent']
+        xmargin, ymargin = xlen * rc.animation_margin, ylen * rc.animation_margin
+        axes.set_xlim(-xmargin, xlen + xmargin)
+        axes.set_ylim(-ymargin, ylen + ymargin)
+        axes.tick_params(axis='both', which='both', bottom=False,
+                         left=False, labelbottom=False, labelleft=False)
+        self.edges = LineCollection(np.zeros((0, 2, 2)), colors=rc.edge_color,
+                                    linewidths=rc.edge_width, zorder=1)
+        axes.add_collection(self.edges)
+        n = self.run.n
+        self.nodes = axes.scatter(np.zeros(n), np.zeros(n), s=rc.node_size, alpha=rc.node_alpha,
+                                  linewidths=rc.node_edge_width, edgecolors=rc.node_edge_color,
+                                  zorder=2)
+        self.messages = axes.scatter([], [], s=rc.message_size, c=rc.message_color,
+                                     marker=rc.message_shape, alpha=rc.message_alpha,
+                                     linewidths=rc.message_edge_width,
+                                     edgecolors=rc.message_edge_color, zorder=rc.message_zorder)
+
+    def render(self, frames: Sequence[int], outdir: str) -> List[str]:
+        '''
+        render frames (indices of RecordedRun) to png files in outdir.
+        '''
+        run, paths = self.run, []
+        for k in frames:
+            pos, t = run.positions(k), run.frame(k)
+            self.nodes.set_offsets(pos)
+            self.nodes.set_facecolors(run.colors(t))
+            self.edges.set_segments(run.segments(pos, t))
+            self.messages.set_offsets(run.messages(pos, t).reshape(-1, 2))
+            path = os.path.join(outdir, f'frame{k:08d}.png')
+            self.fig.savefig(path)
+            paths.append(path)
+        return paths
+
+
+_renderer: RangeRenderer = None     # of each worker process
+
+
+def init_worker(resultdir: str, options: Dict[str, Any]):
+    '''
+    initializer of the pool of render(), the run is loaded once for each process.
+    '''
+    global _renderer
+    _renderer = RangeRenderer(resultdir, options)
+
+
+def render_range(job: Tuple[Sequence[int], str]) -> List[str]:
+    '''
+    worker of render(), (frames, outdir) by the renderer of the process.
+    '''
+    frames, outdir = job
+    return _renderer.render(frames, outdir)
+
+
+def stitch(paths: Sequence[str], path: str, fps: int = None):
+    '''
+    gif of png files by PIL, or video by ffmpeg (other suffix of path).
+    '''
+    fps = fps or rc.animation_fps
+    if path.endswith('.gif'):
+        images = (Image.open(p).convert('RGB') for p in paths[1:])
+        Image.open(paths[0]).convert('RGB').save(
+            path, save_all=True, append_images=images, duration=1000 / fps, loop=0)
+        return
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError('ffmpeg is not found, render to .gif instead.')
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.writelines(f"file '{os.path.abspath(p)}'\nduration {1 / fps}\n" for p in paths)
+    try:
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                        '-i', f.name, '-pix_fmt', 'yuv420p', path], check=True)
+    finally:
+        os.remove(f.name)
+
+
+def render(resultdir: str, path: str = None, processes: int = None, skip: int = None,
+           chunk: int = None, fps: int = None, extent: Tuple[rc.Number, rc.Number] = None,
+           figsize: Tuple[float, float] = None, dpi: float = None) -> str:
+    '''
+    render a saved result directory offline. every skip-th frame is rendered in chunks of
+    chunk frames by a pool of processes, and stitched into path
+    (default: rc.animation_filename in resultdir). return path.
+    extent is the field size recorded with the trajectory if not given.
+    '''
+    path = path or os.path.join(resultdir, rc.animation_filename)
+    skip = skip or rc.animation_skip
+    chunk = chunk or rc.render_chunk
+    count, recorded = recorded_meta(resultdir)
+    frames = list(range(0, count, skip))
+    options = {'life': rc.edge_weight,
+               'extent': extent or recorded,
+               'figsize': figsize or rc.render_figsize, 'dpi': dpi or rc.render_dpi}
+    with tempfile.TemporaryDirectory() as outdir:
+        jobs = [(frames[i:i + chunk], outdir) for i in range(0, len(frames), chunk)]
+        with Pool(processes, initializer=init_worker, initargs=(resultdir, options)) as pool:
+            paths = [p for rendered in pool.imap(render_range, jobs) for p in rendered]
+        stitch(paths, path, fps)
+    return path
+
+
+def render_all(dirpath: str, processes: int = None, **kwargs) -> List[str]:
+    '''
+    render all result directories (which have recorded edges) under dirpath.
+    '''
+    edges = glob.glob(os.path.join(dirpath, '**', rc.edges_filename), recursive=True)
+    return [render(os.path.dirname(e), processes=processes, **kwargs) for e in sorted(edges)]
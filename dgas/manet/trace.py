@@ -0,0 +1,133 @@
+from __future__ import annotations
+from typing import Tuple, Type, Dict, List, Any
+
+import torch
+
+from dgas import rc
+from dgas.manet import field
+
+
+class MobilityTrace:
+    '''
+    initial state, positions after each frame and edge deltas of each frame of a gravity field.
+    mobility doesn't depend on algorithms, so a trace can be replayed by any field of the same n.
+    delta(-1) is the initial edges, and vel is the velocity after the last frame.
+    '''
+
+    def __init__(self, xlen: rc.Number, ylen: rc.Number, pos: torch.Tensor, vel: torch.Tensor,
+                 initial_edges: torch.Tensor):
+        self.xlen = xlen
+        self.ylen = ylen
+        self.initial_pos = pos.cpu().clone()
+        self.initial_vel = vel.cpu().clone()
+        self.initial_edges = initial_edges.cpu().clone()
+        self.pos: List[torch.Tensor] = []
+        self.removed: List[torch.Tensor] = []
+        self.added: List[torch.Tensor] = []
+        self.vel = self.initial_vel
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    @property
+    def n(self) -> int:
+        return len(self.initial_pos)
+
+    def append(self, pos: torch.Tensor, vel: torch.Tensor,
+               removed_index: torch.Tensor, added_index: torch.Tensor):
+        self.pos.append(pos.cpu().clone())
+        self.removed.append(removed_index.cpu().clone())
+        self.added.append(added_index.cpu().clone())
+        self.vel = vel.cpu().clone()
+
+    def delta(self, t: rc.GlobalTime) -> Tuple[torch.Tensor, torch.Tensor]:
+        '''
+        (removed_index, added_index) of frame t.
+        '''
+        if t < 0:
+            return torch.zeros((0, 2), dtype=torch.long), self.initial_edges
+        return self.removed[t], self.added[t]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'xlen': self.xlen, 'ylen': self.ylen,
+                'initial_pos': self.initial_pos, 'initial_vel': self.initial_vel,
+                'initial_edges': self.initial_edges, 'pos': self.pos,
+                'removed': self.removed, 'added': self.added, 'vel': self.vel}
+
+    def save(self, path: str):
+        torch.save(self.to_dict(), path)
+
+
+def load(path: str) -> MobilityTrace:
+    d = torch.load(path)
+    trace = MobilityTrace(d['xlen'], d['ylen'], d['initial_pos'], d['initial_vel'],
+                          d['initial_edges'])
+    trace.pos, trace.removed, trace.added, trace.vel = d['pos'], d['removed'], d['added'], d['vel']
+    return trace
+
+
+def record(n: int, xlen: rc.Number, ylen: rc.Number, frames: int = None) -> MobilityTrace:
+    '''
+    run physics of a random field for frames (default: {rc.trace_frames}).
+    the random state is drawn as field.init_random, same as simulators.
+    '''
+    f = field.init_random(n, xlen, ylen)
+    trace = MobilityTrace(xlen, ylen, f.colliders.pos, f.colliders.vel, f.added_index)
+    for t in range(rc.trace_frames if frames is None else frames):
+        f.update(t)
+        trace.append(f.colliders.pos, f.colliders.vel, f.removed_index, f.added_index)
+    return trace
+
+
+class ReplayField:
+    '''
+    mixin of GravityField subclasses. while the trace lasts, edge deltas and positions are
+    taken from it instead of link detection and physics, and live physics continues after it.
+    '''
+
+    def __init__(self, *args, trace: MobilityTrace = None, **kwargs):
+        self.trace = trace
+        super().__init__(*args, **kwargs)
+
+    def replaying(self, t: rc.GlobalTime) -> bool:
+        return self.trace is not None and t < len(self.trace)
+
+    def edge_delta(self, t: rc.GlobalTime) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        if not self.replaying(t):
+            return super().edge_delta(t)
+        n = len(self.nodes)
+        removed, added = (index.to(self.edge_keys.device) for index in self.trace.delta(t))
+        keys = self.edge_keys[~torch.isin(self.edge_keys, removed[:, 0] * n + removed[:, 1])]
+        keys = torch.sort(torch.cat((keys, added[:, 0] * n + added[:, 1]))).values
+        return keys, removed, added
+
+    def update_colliders(self, t: rc.GlobalTime):
+        if not self.replaying(t):
+            return super().update_colliders(t)
+        self.colliders.pos = self.trace.pos[t].to(rc.device).clone()
+        if t == len(self.trace) - 1:    # live physics continues from here
+            self.colliders.vel = self.trace.vel.to(rc.device).clone()
+
+
+_replay_classes: Dict[type, type] = {}
+
+
+def replay_class(field_class: Type[field.GravityField]) -> Type[field.GravityField]:
+    '''
+    field_class with ReplayField mixed in, which takes trace keyword argument.
+    '''
+    if field_class not in _replay_classes:
+        _replay_classes[field_class] = type('Replay' + field_class.__name__,
+                                            (ReplayField, field_class), {})
+    return _replay_classes[field_class]
+
+
+def init_replay(trace: MobilityTrace, node_class=None,
+                field_class: Type[field.GravityField] = None, identifier=True, **kwargs):
+    '''
+    same as field.init_random, but the field is the initial state of trace and replays it.
+    '''
+    return field.init_field(trace.initial_pos.tolist(), trace.initial_vel.tolist(),
+                            trace.xlen, trace.ylen, node_class,
+                            replay_class(field_class or field.GravityField), identifier,
+                            trace=trace, **kwargs)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+from typing import Tuple, Dict, Any, Union
+import json
+import os
+import shutil
+import struct
+import tempfile
+import weakref
+
+import torch
+import numpy as np
+
+from dgas import rc
+
+HEADER_SIZE = 128   # fixed, so the shape is rewritten in place when the recorder is closed
+QUANTIZE_MAX = np.iinfo(np.uint16).max
+
+
+def _header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    '''
+    npy format 1.0 header padded to HEADER_SIZE.
+    '''
+    d = "{'descr': '%s', 'fortran_order': False, 'shape': %s, }" % (
+        np.lib.format.dtype_to_descr(dtype), repr(tuple(shape)))
+    prefix = np.lib.format.magic(1, 0)
+    d = d.ljust(HEADER_SIZE - len(prefix) - 2 - 1) + '\n'
+    return prefix + struct.pack('<H', len(d)) + d.encode('latin1')
+
+
+def meta_path(path: str) -> str:
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _remove_temporary(file, path: str):
+    '''
+    finalizer of an unsaved recorder, the file is closed and removed with its meta file.
+    '''
+    file.close()
+    for p in (path, meta_path(path)):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+class NpyRecorder:
+    '''
+    rows (of row_shape) appended to a npy file, buffered and written every chunk rows.
+    the file is a temporary one (opened at the first flush) until save() moves it,
+    and meta() is in the json file of the same name.
+    a temporary file not saved is removed when the recorder is collected (or at exit).
+    '''
+
+    def __init__(self, row_shape: Tuple[int, ...], dtype: np.dtype, chunk: int, path: str = None):
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.zeros((chunk, *self.row_shape), dtype=self.dtype)
+        self.buffered = 0
+        self.rows = 0       # rows written or buffered
+        self.path = path
+        self.file = None
+        self._finalizer: weakref.finalize = None
+
+    def append_rows(self, rows: np.ndarray):
+        while len(rows):
+            k = min(len(rows), len(self.buffer) - self.buffered)
+            self.buffer[self.buffered:self.buffered + k] = rows[:k]
+            self.buffered += k
+            self.rows += k
+            rows = rows[k:]
+            if self.buffered == len(self.buffer):
+                self.flush()
+
+    def flush(self):
+        if self.file is None:
+            temporary = self.path is None
+            if temporary:
+                fd, self.path = tempfile.mkstemp(suffix='.npy')
+                os.close(fd)
+            self.file = open(self.path, 'wb')
+            if temporary:
+                self._finalizer = weakref.finalize(self, _remove_temporary, self.file, self.path)
+            self.file.write(_header(self.dtype, (0, *self.row_shape)))
+        self.file.write(self.buffer[:self.buffered].tobytes())
+        self.buffered = 0
+
+    def meta(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self):
+        if self.file is not None and self.file.closed:
+            return
+        self.flush()
+        self.file.seek(0)
+        self.file.write(_header(self.dtype, (self.rows, *self.row_shape)))
+        self.file.close()
+        with open(meta_path(self.path), 'w') as f:
+            json.dump(self.meta(), f, indent=4)
+
+    def save(self, path: str):
+        '''
+        close and move to path (recording ends).
+        '''
+        self.close()
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        shutil.move(self.path, path)
+        shutil.move(meta_path(self.path), meta_path(path))
+        shutil.copymode(meta_path(path), path)  # mkstemp file is 0600, unlike the meta file
+        self.path = path
+
+    def discard(self):
+        '''
+        close and remove the file (recording ends).
+        '''
+        self.close()
+        for p in (self.path, meta_path(self.path)):
+            if os.path.exists(p):
+                os.remove(p)
+
+
+class TrajectoryRecorder(NpyRecorder):
+    '''
+    positions of all frames as a (frames*n*2) npy file, written chunk by chunk.
+    every decimation-th frame is kept, and if quantize, positions are uint16 in the extent.
+    decoding parameters are in the json file of the same name.
+    '''
+
+    def __init__(self, n: int, extent: Tuple[rc.Number, rc.Number],
+                 decimation: int = None, quantize: bool = None, chunk: int = None, path: str = None):
+        self.n = n
+        self.extent = (float(extent[0]), float(extent[1]))
+        self.decimation = decimation or rc.trajectory_decimation
+        self.quantize = rc.trajectory_quantize if quantize is None else quantize
+        super().__init__((n, 2), np.uint16 if self.quantize else np.float32,
+                         chunk or rc.trajectory_chunk, path=path)
+        self.seen = 0       # frames given to append
+
+    def __len__(self) -> int:
+        return self.frames
+
+    @property
+    def frames(self) -> int:
+        return self.rows
+
+    def append(self, pos: torch.Tensor):
+        seen, self.seen = self.seen, self.seen + 1
+        if seen % self.decimation:
+            return
+        pos = pos.detach().cpu().numpy()
+        if self.quantize:
+            scale = QUANTIZE_MAX / np.array(self.extent, dtype=np.float32)
+            pos = np.rint(np.clip(pos * scale, 0, QUANTIZE_MAX))
+        self.append_rows(pos[None])
+
+    def meta(self) -> Dict[str, Any]:
+        return {'frames': self.frames, 'nodes': self.n, 'decimation': self.decimation,
+                'quantize': self.quantize, 'extent': self.extent}
+
+
+class EdgeRecorder(NpyRecorder):
+    '''
+    link deltas of all frames (not decimated) as a (events*4) int32 npy file of rows
+    (frame, u, v, added), where u < v are collider indices and added is 1 or 0 (removed).
+    '''
+
+    def __init__(self, n: int, chunk: int = None, path: str = None):
+        self.n = n
+        super().__init__((4,), np.int32, chunk or rc.trajectory_chunk, path=path)
+
+    def append(self, t: rc.GlobalTime, added_index: torch.Tensor, removed_index: torch.Tensor):
+        for index, added in ((added_index, 1), (removed_index, 0)):
+            index = index.cpu().numpy()
+            rows = np.empty((len(index), 4), dtype=np.int32)
+            rows[:, 0], rows[:, 1:3], rows[:, 3] = t, index, added
+            self.append_rows(rows)
+
+    def meta(self) -> Dict[str, Any]:
+        return {'events': self.rows, 'nodes': self.n}
+
+
+class TrajectoryReader:
+    '''
+    memory mapped trajectory. reader[k] is the positions (n*2 float32) of frame reader.frame(k).
+    '''
+
+    def __init__(self, path: str):
+        self.data = np.load(path, mmap_mode='r')
+        with open(meta_path(path)) as f:
+            meta = json.load(f)
+        self.decimation = meta['decimation']
+        self.quantize = meta['quantize']
+        self.extent = np.array(meta['extent'], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, key: Union[int, slice]) -> np.ndarray:
+        pos = self.data[key]
+        if self.quantize:
+            return pos.astype(np.float32) * (self.extent / QUANTIZE_MAX)
+        return np.asarray(pos)
+
+    def frame(self, k: int) -> rc.GlobalTime:
+        return k * self.decimation
+
+
+class EdgeReader:
+    '''
+    links of an edge file as intervals, the link u-v is from frame start until before end.
+    '''
+
+    def __init__(self, path: str):
+        events = np.load(path)
+        events = events[np.lexsort((events[:, 0], events[:, 2], events[:, 1]))]
+        added = events[:, 3] == 1
+        # a link is added and removed alternately, so removal follows its addition
+        follows = np.append(~added[1:] & (events[1:, 1:3] == events[:-1, 1:3]).all(axis=1), False)
+        self.u, self.v = events[added, 1], events[added, 2]
+        self.start = events[added, 0]
+        self.end = np.where(follows[added], np.append(events[1:, 0], 0)[added], np.iinfo(np.int64).max)
+
+    def __getitem__(self, t: rc.GlobalTime) -> np.ndarray:
+        '''
+        linked pairs (E*2) of collider index at frame t.
+        '''
+        linked = (self.start <= t) & (t < self.end)
+        return np.stack((self.u[linked], self.v[linked]), axis=1)
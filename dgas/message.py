@@ -1,35 +1,231 @@
 from __future__ import annotations
-from typing import Union, List, Set, Dict
+from typing import Union, List, Set, Dict, Tuple, Sequence
+import heapq
 
 import torch
+import numpy as np
 
 from dgas import rc, node, edge, plot
 
 
-def position(message: Message, pos: Dict[node.Node, torch.Tensor]) -> torch.Tensor:
+def position(message: Message, pos: Dict[node.Node, torch.Tensor], t: rc.GlobalTime) -> torch.Tensor:
     frompos, topos = pos[message.from_node], pos[message.to_node]
-    return frompos + (topos - frompos) * message.progress()
+    return frompos + (topos - frompos) * message.progress(t)
+
+
+class MessageTable:
+    '''
+    messages in flight as struct of arrays. a row is appended in amortized O(1)
+    (free rows are reused, else columns grow by doubling), and removed in bulk.
+    nodes are registered to integer indices on first use,
+    and calendar queue of arrival frames holds (row, serial) to skip reused rows.
+    '''
+
+    def __init__(self, capacity: int = 64):
+        self.nodes: List[node.Node] = []
+        self.node_index: Dict[node.Node, int] = {}
+        self.from_index = np.zeros(capacity, dtype=np.int64)
+        self.to_index = np.zeros(capacity, dtype=np.int64)
+        self.sended_frame = np.zeros(capacity, dtype=np.int64)
+        self.arrival_frame = np.zeros(capacity, dtype=np.int64)
+        self.init_life = np.zeros(capacity, dtype=np.int64)
+        self.serial = np.full(capacity, -1, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.raw = np.empty(capacity, dtype=object)
+        self.edge = np.empty(capacity, dtype=object)
+        self.drawable = np.empty(capacity, dtype=object)
+        self.size = 0       # rows [0, size) are used or free
+        self.free: List[int] = []
+        self.calendar: Dict[rc.GlobalTime, Tuple[List[int], List[int]]] = {}
+        self._calendar_frames: List[rc.GlobalTime] = []
+        self._serial = 0
+
+    def __len__(self) -> int:
+        return self.size - len(self.free)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.alive)
+
+    def index(self, n: node.Node) -> int:
+        i = self.node_index.get(n)
+        if i is None:
+            i = self.node_index[n] = len(self.nodes)
+            self.nodes.append(n)
+        return i
+
+    def append(self, from_node: node.Node, to_node: node.Node, msg: rc.MessageType,
+               edgedata: edge.EdgeData, drawable: plot.DrawableMessage = None,
+               frame: rc.GlobalTime = 0) -> int:
+        '''
+        amortized O(1). life 1 message is received in the same frame as it is sended.
+        '''
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(2 * self.capacity)
+            row, self.size = self.size, self.size + 1
+        arrival = frame + max(edgedata.weight, 1) - 1
+        self.from_index[row] = self.index(from_node)
+        self.to_index[row] = self.index(to_node)
+        self.sended_frame[row] = frame
+        self.arrival_frame[row] = arrival
+        self.init_life[row] = edgedata.weight
+        self.serial[row] = self._serial
+        self.alive[row] = True
+        self.raw[row] = msg.raw if isinstance(msg, Message) else msg
+        self.edge[row] = edgedata
+        self.drawable[row] = drawable
+        self._schedule(row, arrival)
+        self._serial += 1
+        return row
+
+    def remove(self, rows: Union[Sequence[int], np.ndarray]):
+        '''
+        O(len(rows)) in numpy, rows which are already removed are ignored.
+        '''
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = np.unique(rows[self.alive[rows]])
+        self.alive[rows] = False
+        self.raw[rows] = None
+        self.edge[rows] = None
+        self.drawable[rows] = None
+        self.free.extend(rows.tolist())
+
+    def rows(self, from_node: node.Node = None) -> np.ndarray:
+        '''
+        rows of alive messages (sended by from_node if given). O(capacity) in numpy.
+        '''
+        alive = self.alive[:self.size]
+        if from_node is not None:
+            if from_node not in self.node_index:
+                return np.zeros(0, dtype=np.int64)
+            alive = alive & (self.from_index[:self.size] == self.node_index[from_node])
+        return np.flatnonzero(alive)
+
+    def remain_life(self, t: rc.GlobalTime, rows: np.ndarray = None) -> np.ndarray:
+        rows = self.rows() if rows is None else rows
+        return np.maximum(self.arrival_frame[rows] - t, 0)
+
+    def progress(self, t: rc.GlobalTime, rows: np.ndarray = None) -> np.ndarray:
+        rows = self.rows() if rows is None else rows
+        life = self.init_life[rows]
+        done = (t + 1 - self.sended_frame[rows]) / np.maximum(life, 1)
+        return np.where(life <= 0, 1.0, np.clip(done, 0.0, 1.0))
+
+    def positions(self, nodepos: np.ndarray, t: rc.GlobalTime, rows: np.ndarray = None) -> np.ndarray:
+        '''
+        positions (M*2) of messages at t, same as position() of each message.
+        nodepos is positions of registered nodes in order of node index.
+        '''
+        rows = self.rows() if rows is None else rows
+        frompos, topos = nodepos[self.from_index[rows]], nodepos[self.to_index[rows]]
+        return frompos + (topos - frompos) * self.progress(t, rows)[:, None]
+
+    def gather(self, rows: np.ndarray) -> List[Tuple[node.Node, node.Node, rc.MessageType]]:
+        '''
+        (from node, to node, raw message) of each row.
+        '''
+        nodes = self.nodes
+        return [(nodes[f], nodes[to], raw) for f, to, raw
+                in zip(self.from_index[rows].tolist(), self.to_index[rows].tolist(), self.raw[rows])]
+
+    def view(self, row: int) -> Message:
+        return Message(self, row)
+
+    def pop_arrivals(self, t: rc.GlobalTime) -> np.ndarray:
+        '''
+        pop rows whose arrival frame is t or before from calendar queue.
+        O(arrivals), rows removed in the meantime are skipped.
+        '''
+        rows, serials = [], []
+        while self._calendar_frames and self._calendar_frames[0] <= t:
+            frame_rows, frame_serials = self.calendar.pop(heapq.heappop(self._calendar_frames))
+            rows += frame_rows
+            serials += frame_serials
+        rows = np.array(rows, dtype=np.int64)
+        return rows[self.alive[rows] & (self.serial[rows] == serials)]
+
+    def _schedule(self, row: int, frame: rc.GlobalTime):
+        if frame not in self.calendar:
+            self.calendar[frame] = ([], [])
+            heapq.heappush(self._calendar_frames, frame)
+        rows, serials = self.calendar[frame]
+        rows.append(row)
+        serials.append(self._serial)
+
+    def _grow(self, capacity: int):
+        for name in ('from_index', 'to_index', 'sended_frame', 'arrival_frame',
+                     'init_life', 'serial', 'alive', 'raw', 'edge', 'drawable'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            new[len(old):] = None if old.dtype == object else 0
+            setattr(self, name, new)
 
 
 class Message:
-    def __init__(self, msg: rc.MessageType, from_node: node.Node, to_node: node.Node,
-                 edgedata: edge.EdgeData, drawable: plot.DrawableMessage = None):
-        self.drawable_stack = [drawable or plot.DrawableMessage()]
-        self.raw: rc.MessageType = msg.raw if isinstance(msg, Message) else msg
-        self.from_node = from_node
-        self.to_node = to_node
-        self.edge = edgedata
-        self.init_life = edgedata.weight
-        self.remain_life = edgedata.weight
+    '''
+    lightweight view of a row of MessageTable, valid while the message is in flight.
+    '''
+    __slots__ = ('table', 'row', 'serial')
+
+    def __init__(self, table: MessageTable, row: int):
+        self.table = table
+        self.row = row
+        self.serial = int(table.serial[row])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Message) and self.table is other.table and self.serial == other.serial
+
+    def __hash__(self) -> int:
+        return hash((id(self.table), self.serial))
+
+    @property
+    def raw(self) -> rc.MessageType:
+        return self.table.raw[self.row]
+
+    @property
+    def from_node(self) -> node.Node:
+        return self.table.nodes[self.table.from_index[self.row]]
+
+    @property
+    def to_node(self) -> node.Node:
+        return self.table.nodes[self.table.to_index[self.row]]
+
+    @property
+    def edge(self) -> edge.EdgeData:
+        return self.table.edge[self.row]
+
+    @property
+    def init_life(self) -> rc.GlobalTimeDelta:
+        return int(self.table.init_life[self.row])
+
+    @property
+    def sended_frame(self) -> rc.GlobalTime:
+        return int(self.table.sended_frame[self.row])
+
+    @property
+    def arrival_frame(self) -> rc.GlobalTime:
+        return int(self.table.arrival_frame[self.row])
+
+    def alive(self) -> bool:
+        return bool(self.table.alive[self.row]) and self.table.serial[self.row] == self.serial
 
     def drawable(self) -> plot.DrawableMessage:
-        return self.drawable_stack[-1]
+        drawable = self.table.drawable[self.row]
+        if drawable is None:
+            drawable = self.table.drawable[self.row] = plot.DrawableMessage()
+        return drawable
 
-    def arrive(self) -> bool:
-        return self.remain_life <= 0
+    def remain_life(self, t: rc.GlobalTime) -> rc.GlobalTimeDelta:
+        return max(self.arrival_frame - t, 0)
 
-    def progress(self) -> float:
-        return 1 - self.remain_life / self.init_life
+    def arrive(self, t: rc.GlobalTime) -> bool:
+        return self.arrival_frame <= t
 
-    def update(self, t: rc.GlobalTime):
-        self.remain_life -= 1 if self.remain_life > 0 else 0
+    def progress(self, t: rc.GlobalTime) -> float:
+        if self.init_life <= 0:
+            return 1.0
+        return min(max((t + 1 - self.sended_frame) / self.init_life, 0.0), 1.0)
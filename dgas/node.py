@@ -7,15 +7,20 @@ from dgas import rc, graph, edge, message, plot, result
 
 
 class Node:
+    __slots__ = ('_graph', 'drawable_stack', 'identifier', 'clashed', '_neighbor_index')
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
         self._graph = g
-        self.drawable_stack = [drawable or plot.DrawableNode()]
+        self.drawable_stack = [drawable]    # None is replaced by default drawable when drawn
         self.identifier = identifier
         self.clashed = False
+        self._neighbor_index: Dict[rc.NodeID, Node] = None
 
     def drawable(self) -> plot.DrawableNode:
+        if self.drawable_stack[-1] is None:
+            self.drawable_stack[-1] = plot.DrawableNode()
         return self.drawable_stack[-1]
 
     def __str__(self) -> str:
@@ -25,9 +30,19 @@ class Node:
         '''
         dictionary whose key is node's ID and value is node's instance.
         if node's ID is None, for example anonymous network, this method return size 1 dict.
-        this method is O(self.degree()) so should save returned dict instance.
+        the dict is cached until invalidate_neighbors(), so O(1) except the first call after
+        incident edges change. don't modify returned dict.
         '''
-        return {nei.identifier: nei for nei in self._graph.neighbors(self)}
+        if self._neighbor_index is None:
+            self._neighbor_index = {nei.identifier: nei for nei in self._graph.neighbors(self)}
+        return self._neighbor_index
+
+    def invalidate_neighbors(self):
+        '''
+        drop cached neighbors_id(). field call this when incident edges of this node change,
+        and who edit graph directly must call this for both ends.
+        '''
+        self._neighbor_index = None
 
     def neighbors(self) -> List[rc.NodeID]:
         '''
@@ -53,8 +68,7 @@ class Node:
         '''
         if not self.clashed:
             e: edge.EdgeData = self._graph[self][to_node][rc.edge_key]
-            self._graph.add_message(self, message.Message(
-                msg, self, to_node, e, drawable))
+            self._graph.add_message(self, to_node, msg, e, drawable)
             self.on_inject(to_node, msg)
 
     def receive(self, from_node: Node, msg: rc.MessageType):
@@ -63,7 +77,7 @@ class Node:
 
     def send(self, to: rc.NodeID, msg: rc.MessageType, drawable: plot.DrawableMessage = None):
         '''
-        O(self.degree()) because find Node instance by it's ID from neighbors.
+        O(1) by cached neighbors_id().
         '''
         self.inject(self.neighbors_id()[to], msg, drawable)
 
@@ -79,15 +93,16 @@ class Node:
         '''
         O(self.degree()), and if `without` include non-neighbor, it is ignored.
         '''
+        without = set(without or [])
         for nei in self._graph.neighbors(self):
-            if nei.identifier not in set(without or []):
+            if nei.identifier not in without:
                 self.inject(nei, msg, drawable)
 
     def broadcast_to(self, msg: Union[rc.MessageType, Callable[[rc.NodeID], rc.MessageType]],
                      to: Iterable[rc.NodeID],
                      drawable: Union[plot.DrawableMessage, Iterable[plot.DrawableMessage]] = None):
         '''
-        O(self.degree()) because find Node instance by it's ID from neighbors.
+        O(len(to)) by cached neighbors_id().
         '''
         nei_dict = self.neighbors_id()
         if callable(msg):
@@ -101,7 +116,7 @@ class Node:
         if not self.clashed:
             self.clashed = True
             self.drawable_stack.append(
-                plot.DrawableNode(color=rc.node_clashed_color))
+                None if rc.headless else plot.DrawableNode(color=rc.node_clashed_color))
             self.on_crash()
 
     def recover(self):
@@ -139,20 +154,20 @@ class Node:
 
 
 class LoggingNode(Node):
+    __slots__ = ('record',)
+
     def __init__(self, g: Union[graph.UndirectedGraph, graph.DirectedGraph,
                                 graph.UndirectedMultiGraph, graph.DirectedMultiGraph],
                  identifier: rc.NodeID = None, drawable: plot.DrawableNode = None):
         super().__init__(g, identifier=identifier, drawable=drawable)
-        self.record = result.NodeRecord(identifier)
+        self.record = result.NodeRecord(identifier, getattr(g, 'messagetable', None))
 
     def inject(self, to_node: Node, msg: rc.MessageType, drawable: plot.DrawableMessage = None):
-        self.record.sended_message.append(
-            result.MessageRecord(self.record.frame, to_node, msg))
+        self.record.log_sended(self, to_node, msg)
         return super().inject(to_node, msg, drawable=drawable)
 
     def receive(self, from_node: Node, msg: rc.MessageType):
-        self.record.received_message.append(
-            result.MessageRecord(self.record.frame, from_node, msg))
+        self.record.log_received(from_node, self, msg)
         return super().receive(from_node, msg)
 
     def update(self, t):
@@ -1,15 +1,15 @@
 from __future__ import annotations
 from typing import NewType, List, Iterable, Sequence, Tuple, Dict, Union, Callable, Any
-
-import itertools
+import warnings
 
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.animation as anm
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
 import torch
+import numpy as np
 import networkx as nx
-from networkx.drawing import nx_pylab
-from collections import abc
 
 from dgas import rc, time, daemon, graph, node, message
 
@@ -72,21 +72,20 @@ class DrawableMessage:
         self.edgecolor = edgecolor or rc.message_edge_color
 
 
-def list_from_messages(messages: Iterable[message.Message]) -> List[Tuple[List[message.Message], Dict[str, List]]]:
-    def to_dict_of_list(messages: List[message.Message]) -> Tuple[List[message.Message], Dict[str, List]]:
-        size = [message.drawable().size for message in messages]
-        color = [message.drawable().color for message in messages]
-        shape = [message.drawable().shape for message in messages]
-        alpha = [message.drawable().alpha for message in messages]
-        linewidth = [message.drawable().edgewidth for message in messages]
-        linecolor = [message.drawable().edgecolor for message in messages]
-        return messages, {'message_size': size, 'message_color': color, 'message_shape': shape,
-                          'alpha': alpha, 'linewidths': linewidth, 'linecolors': linecolor}
-    return [to_dict_of_list(list(msgs)) for _shape, msgs in itertools.groupby(messages, lambda m: m.drawable().shape)]
+def require_drawables():
+    '''
+    raise if rc.headless, where nodes and edges are not colored by algorithms
+    and default weight edges share one drawable, so a drawing would be wrong.
+    '''
+    if rc.headless:
+        raise RuntimeError('nodes and edges are not drawable in headless mode, '
+                           + 'simulate with rc.headless = False to draw.')
 
 
 def draw_nodes(g: graph.GraphType, pos: Dict[node.Node, torch.Tensor] = None,
                nodelist: List[DrawableNode] = None, ax: plt.Axes = None) -> matplotlib.collections.PathCollection:
+    require_drawables()
+    g = graph.networkx_view(g)
     drawable = list_from_nodes(node.drawable()
                                for node in nodelist or g.nodes())
     return nx.draw_networkx_nodes(g, pos, nodelist=nodelist, ax=ax, **drawable)
@@ -94,35 +93,50 @@ def draw_nodes(g: graph.GraphType, pos: Dict[node.Node, torch.Tensor] = None,
 
 def draw_identifier(g: graph.GraphType, pos: Dict[node.Node, torch.Tensor] = None,
                     ax=None, **kwargs) -> Dict[node.Node, matplotlib.text.Text]:
+    require_drawables()
+    g = graph.networkx_view(g)
     labels = {node: node.identifier for node in g.nodes()}
     return nx.draw_networkx_labels(g, pos, labels, ax=ax, **kwargs)
 
 
 def draw_edges(g: graph.GraphType, pos: Dict[node.Node, torch.Tensor] = None,
                edgelist: List[DrawableEdge] = None, ax: plt.Axes = None) -> Union[matplotlib.collections.LineCollection, List[matplotlib.patches.FancyArrowPatch]]:
+    require_drawables()
+    g = graph.networkx_view(g)
     drawable = list_from_edges(
         edge[2].drawable() for edge in edgelist or g.edges.data(rc.edge_key))
     return nx.draw_networkx_edges(g, pos, edgelist=edgelist, ax=ax, **drawable)
 
 
-def draw_messages(g: graph.GraphType, pos: Dict[node.Node, torch.Tensor],
+def draw_messages(g: graph.GraphType, pos: Union[Dict[node.Node, torch.Tensor], np.ndarray],
                   messagelist: List[message.Message] = None, ax: plt.Axes = None) -> List[matplotlib.collections.PathCollection]:
-    messages = messagelist or g.messages()
+    '''
+    positions of all messages are interpolated at once by MessageTable.positions(),
+    and drawn by a scatter for each shape. pos is positions of nodes, or an array of positions
+    of nodes registered to the message table of g (in order of node index).
+    '''
+    require_drawables()
+    table = g.messagetable
+    rows = np.array([m.row for m in messagelist], dtype=np.int64) if messagelist else table.rows()
     axes = ax or plt.gca()
     message_collections = []
-    for same_shapes, dic in list_from_messages(message for message in messages):
-        size, color, alpha = dic['message_size'], dic['message_color'], dic['alpha']
-        linewidth, linecolor = dic['linewidths'], dic['linecolors']
-        xy = torch.Tensor([message.position(m, pos) for m in same_shapes])
-        if isinstance(alpha, abc.Iterable):
-            color = nx_pylab.apply_alpha(color, alpha, same_shapes,
-                                         cmap=None, vmin=None, vmax=None)
-            alpha = None
-        plotted_messages = axes.scatter(xy[:, 0], xy[:, 1], s=size, c=color,
-                                        marker=same_shapes[0].drawable().shape,
-                                        alpha=alpha, linewidths=linewidth, edgecolors=linecolor)
-        plotted_messages.set_zorder(rc.message_zorder)
-        message_collections.append(plotted_messages)
+    if len(rows):
+        nodepos = pos if isinstance(pos, np.ndarray) else \
+            np.array([np.asarray(pos[n], dtype=np.float32) for n in table.nodes])
+        xy = table.positions(nodepos, g.frame, rows)
+        default = DrawableMessage()     # not stored to the table, unlike Message.drawable()
+        drawables = [d or default for d in table.drawable[rows].tolist()]
+        shapes = np.array([d.shape for d in drawables])
+        for shape in np.unique(shapes):
+            index = np.flatnonzero(shapes == shape)
+            same_shapes = [drawables[i] for i in index.tolist()]
+            color = to_rgba_array([d.color for d in same_shapes], [d.alpha for d in same_shapes])
+            plotted_messages = axes.scatter(xy[index, 0], xy[index, 1],
+                                            s=[d.size for d in same_shapes], c=color, marker=shape,
+                                            linewidths=[d.edgewidth for d in same_shapes],
+                                            edgecolors=[d.edgecolor for d in same_shapes])
+            plotted_messages.set_zorder(rc.message_zorder)
+            message_collections.append(plotted_messages)
 
     axes.tick_params(axis='both', which='both', bottom=False,
                      left=False, labelbottom=False, labelleft=False)
@@ -161,29 +175,121 @@ def artistanimate_daemon(d: daemon.DaemonType,
     return anm.ArtistAnimation(fig or plt.gcf(), artists_list, **kwargs)
 
 
-def artistanimate_manet_daemon(md: daemon.ManetDaemon, identifier=False, message=False,
-                               edge=True, ax: plt.Axes = None, fig: plt.Figure = None,
-                               untiltime: rc.GlobalTime = None, timeout: rc.GlobalTime = None,
-                               condition: Callable[[Any], bool] = lambda x: False,
-                               arg: Any = None, **kwargs) -> anm.ArtistAnimation:
-    axes = ax or plt.gca()
-    # axes.set_xlim(left=md.field.west, right=md.field.east)
-    # axes.set_ylim(bottom=md.field.south, top=md.field.north)
-
-    def update(t: rc.GlobalTime) -> List[plt.Artist]:
-        md.each_loop(t)
-        position = md.field.pos_dict()
-        artists = [draw_nodes(md.graph, position, ax=axes)]
-        if identifier:
-            label_dic = draw_identifier(md.graph, position, ax=axes, **kwargs)
+class ManetRenderer:
+    '''
+    artists of a manet daemon, created once and updated in place by update().
+    nodes are a PathCollection and edges a LineCollection in order of collider index,
+    and messages (whose number changes) are redrawn after removing the previous ones.
+    limits of axes are the field with margin, since artists moved in place don't autoscale.
+    '''
+
+    def __init__(self, md: daemon.ManetDaemon, identifier=False, message=False, edge=True,
+                 ax: plt.Axes = None, **kwargs):
+        require_drawables()
+        self.md = md
+        self.axes = ax or plt.gca()
+        self.message = message
+        self.index = md.field.node_index()
+        self.nodes = sorted(self.index, key=self.index.get)
+        pos = md.field.colliders.pos.cpu().numpy()
+        drawable = list_from_nodes(n.drawable() for n in self.nodes)
+        self.node_artist = self.axes.scatter(
+            pos[:, 0], pos[:, 1], s=drawable['node_size'],
+            c=to_rgba_array(drawable['node_color'], drawable['alpha']),
+            linewidths=drawable['linewidths'], edgecolors=drawable['edgecolors'], zorder=2)
+        self.edge_artist: LineCollection = None
         if edge:
-            artists.append(draw_edges(md.graph, position, ax=axes))
-        if message:
-            artists.extend(draw_messages(md.graph, position, ax=axes))
-        labels = list(label_dic.values()) if identifier else []
-        return artists + [*labels]
-
-    artists_list = time.loop(untiltime=untiltime, timeout=timeout,
-                             condition=condition, conditionarg=arg,
-                             eachloop=update, timeeachlooparg=True, eachloopreturn=True)
-    return anm.ArtistAnimation(fig or plt.gcf(), artists_list, **kwargs)
+            self.edge_artist = LineCollection(np.zeros((0, 2, 2)), zorder=1)
+            self.axes.add_collection(self.edge_artist)
+        self.labels: List[matplotlib.text.Text] = []
+        if identifier:
+            self.labels = [self.axes.text(x, y, n.identifier, ha='center', va='center',
+                                          zorder=3, **kwargs)
+                           for n, (x, y) in zip(self.nodes, pos.tolist())]
+        self.message_artists: List[matplotlib.collections.PathCollection] = []
+        self.table_index = np.zeros(0, dtype=np.int64)   # collider index of nodes of message table
+        field = md.field
+        xmargin, ymargin = field.xlen * rc.animation_margin, field.ylen * rc.animation_margin
+        self.axes.set_xlim(field.west - xmargin, field.east + xmargin)
+        self.axes.set_ylim(field.south - ymargin, field.north + ymargin)
+        self.axes.tick_params(axis='both', which='both', bottom=False,
+                              left=False, labelbottom=False, labelleft=False)
+
+    def update(self) -> List[plt.Artist]:
+        pos = self.md.field.colliders.pos.cpu().numpy()
+        self.node_artist.set_offsets(pos)
+        drawable = list_from_nodes(n.drawable() for n in self.nodes)
+        self.node_artist.set_facecolors(to_rgba_array(drawable['node_color'], drawable['alpha']))
+        if self.edge_artist is not None:
+            edges = list(graph.networkx_view(self.md.graph).edges.data(rc.edge_key))
+            u = [self.index[e[0]] for e in edges]
+            v = [self.index[e[1]] for e in edges]
+            self.edge_artist.set_segments(np.stack((pos[u], pos[v]), axis=1) if edges
+                                          else np.zeros((0, 2, 2)))
+            drawable = list_from_edges(e[2].drawable() for e in edges)
+            self.edge_artist.set_color(drawable['edge_color'])
+            self.edge_artist.set_linewidths(drawable['width'])
+            self.edge_artist.set_linestyles(drawable['style'])
+        for label, xy in zip(self.labels, pos.tolist()):
+            label.set_position(xy)
+        if self.message:
+            for artist in self.message_artists:
+                artist.remove()
+            table = self.md.graph.messagetable
+            if len(self.table_index) < len(table.nodes):
+                added = [self.index[n] for n in table.nodes[len(self.table_index):]]
+                self.table_index = np.concatenate((self.table_index, added)).astype(np.int64)
+            self.message_artists = draw_messages(self.md.graph, pos[self.table_index], ax=self.axes)
+        return self.artists()
+
+    def artists(self) -> List[plt.Artist]:
+        edges = [self.edge_artist] if self.edge_artist is not None else []
+        return [self.node_artist, *edges, *self.message_artists, *self.labels]
+
+
+def movie_writer(writer: str = None, fps: int = None) -> anm.AbstractMovieWriter:
+    '''
+    matplotlib writer by name (default: rc.animation_writer), or the first available
+    of rc.animation_writers. pillow keeps all frames in memory until the end.
+    '''
+    writer = writer or rc.animation_writer
+    if writer is None:
+        writer = next((w for w in rc.animation_writers if anm.writers.is_available(w)), None)
+        if writer is None:
+            raise RuntimeError(f'none of {rc.animation_writers} is available.')
+        if writer == 'pillow':
+            warnings.warn('ffmpeg is not found, pillow keeps all frames of animation in memory.')
+    return anm.writers[writer](fps=fps or rc.animation_fps)
+
+
+def stream_manet_daemon(md: daemon.ManetDaemon, path: str, writer: str = None,
+                        skip: int = None, fps: int = None, dpi: float = None,
+                        identifier=False, message=False, edge=True,
+                        ax: plt.Axes = None, fig: plt.Figure = None,
+                        untiltime: rc.GlobalTime = None, timeout: rc.GlobalTime = None,
+                        condition: Callable[[Any], bool] = lambda x: False,
+                        arg: Any = None, **kwargs) -> int:
+    '''
+    simulate md with each skip-th frame rendered by ManetRenderer and grabbed by movie_writer(writer)
+    to path while the simulation advances. return the number of rendered frames.
+    '''
+    figure = fig or plt.gcf()
+    renderer = ManetRenderer(md, identifier=identifier, message=message, edge=edge,
+                             ax=ax or figure.gca(), **kwargs)
+    moviewriter = movie_writer(writer, fps)
+    skip = skip or rc.animation_skip
+    rendered = 0
+
+    def update(t: rc.GlobalTime):
+        nonlocal rendered
+        md.each_loop(t)
+        if t % skip == 0:
+            renderer.update()
+            moviewriter.grab_frame()
+            rendered += 1
+
+    with moviewriter.saving(figure, path, dpi or figure.dpi):
+        time.loop(untiltime=untiltime, timeout=timeout,
+                  condition=condition, conditionarg=arg,
+                  eachloop=update, timeeachlooparg=True)
+    return rendered
@@ -15,6 +15,7 @@ undirected_graph = 'undirected'
 directed_graph = 'directed'
 undirected_multigraph = 'undirected multi'
 directed_multigraph = 'directed multi'
+undirected_csr_graph = 'undirected csr'
 
 
 timeout = 100
@@ -23,6 +24,10 @@ timeout = 100
 edge_key = 'data'
 edge_weight = 1
 
+# drawables are not allocated until plot asks, default weight edges share one EdgeData
+# and algorithms don't color nodes and edges, so plot functions raise in headless mode
+headless = False
+
 
 node_size = 100
 node_color = '#1f78b4'
@@ -62,14 +67,43 @@ key_sended_node_log = 'to_id'
 key_received_frame_log = 'received_frame'
 key_received_node_log = 'from_id'
 
+key_node_sended_count_log = 'sended_count'
+key_node_received_count_log = 'received_count'
+key_node_first_sended_log = 'first_sended_frame'
+key_node_first_received_log = 'first_received_frame'
+key_node_last_received_log = 'last_received_frame'
+
+# LoggingNode keeps counts of events and the last received frame (count),
+# and also frames of first events (first), and also all events in arrays (full)
+node_log_count = 'count'
+node_log_first = 'first'
+node_log_full = 'full'
+node_log_level = node_log_full
+
 
 key_nodes_result = 'nodes'
 key_graph_result = 'graph'
 
 animation_filename = 'animation.gif'
 
+# animations rendered during simulation keep every skip-th frame, written by animation_writer
+# (name of matplotlib writer) or else the first available of animation_writers. ffmpeg pipes
+# each frame to the encoder and keeps memory constant, but pillow (the fallback without
+# ffmpeg) keeps all frames in memory until the end, so it grows with the number of frames
+animation_writer = None
+animation_writers = ['ffmpeg', 'pillow']
+animation_fps = 30
+animation_skip = 1
+animation_margin = 0.05
+
+# offline rendering of saved results, frames are rendered in chunks by a pool of processes
+render_chunk = 32
+render_figsize = (6.4, 4.8)
+render_dpi = 100
+
 ### MANET ###
 collider_index_key = 'collider'
+field_graph = undirected_graph
 
 rand_node_vel_min = -3
 rand_node_vel_max = 3
@@ -77,6 +111,14 @@ rand_node_vel_max = 3
 manet_node_size = 100.0
 communication_radius = 250.0
 
+neighbor_search_dense = 'dense'
+neighbor_search_cell = 'cell'
+neighbor_search_tiled = 'tiled'
+neighbor_search_verlet = 'verlet'
+neighbor_search = neighbor_search_cell
+
+verlet_skin = 100.0
+
 field_xlen = 1600.0
 field_ylen = 1000.0
 
@@ -89,12 +131,55 @@ attraction_power = 1
 repultion_coefficient = 250.0
 repultion_power = 2
 
+gravity_solver_exact = 'exact'
+gravity_solver_tiled = 'tiled'
+gravity_solver_barnes_hut = 'barneshut'
+gravity_solver = gravity_solver_exact
+
+barnes_hut_theta = 0.5
+barnes_hut_depth = 16
+barnes_hut_chunk = 4096
+
+pairwise_tile = 1024
+
 wall_repultion_coefficient = 1.0
 wall_repultion_power = 0.5
 
 wall_reflection = True
 
+# batch simulation keeps dense (replicas x n x n) pair tensors for physics and the oracle,
+# so a batch is split to keep replicas * n**2 under batch_max_pairs (about 100MB of work).
+# it pays off for small fields (about 1.5x faster per replica at n <= 150 with 16-64 replicas),
+# but from n of 300 it is no faster than one simulator at a time and takes twice the memory
+batch_max_pairs = 2**20
+
+# frames recorded in a mobility trace, replay continues by live physics after them
+trace_frames = 100
+trace_filename = 'trace.pt'
+
 key_pos_log = 'pos'
+
+# positions of LoggingGravityField are kept in field.json (json) or a binary file (npy),
+# which keeps every decimation-th frame, as uint16 in the field if quantize.
+# with npy, link deltas of every frame are also kept in the edges file
+trajectory_format_json = 'json'
+trajectory_format_npy = 'npy'
+trajectory_format = trajectory_format_json
+trajectory_decimation = 1
+trajectory_quantize = False
+trajectory_chunk = 256
+trajectory_filename = 'trajectory.npy'
+edges_filename = 'edges.npy'
+
+# results are saved as json files (json), or whole and field as json and nodes and frames
+# as json lines (ndjson), where frames are written during simulation every chunk frames
+result_format_json = 'json'
+result_format_ndjson = 'ndjson'
+result_format = result_format_json
+result_compress = False
+result_stream_chunk = 64
+key_frames_result = 'frames'
+key_frame_log = 'frame'
 key_connectivity_log = 'connectivity'
 key_first_edge_log = 'first_edge'
 key_edge_added_times_log = 'edge_added'
@@ -137,6 +222,18 @@ key_result_success = 'success'
 
 key_field_result = 'field'
 
+# adaptive replication stops a cell when the confidence intervals of metrics
+# (relative to the mean) are narrower than the target. rates are only reported unless
+# adaptive_rate_error (absolute) is set, since their Wilson interval needs at least
+# z**2 * (1 / (2 * error) - 1) runs even if all runs agree (35 for 0.05, 16 for 0.1)
+adaptive_metrics = [key_result_all_sended_messages, key_result_convergence_frame]
+adaptive_rates = [key_result_success]
+adaptive_confidence_z = 1.96
+adaptive_relative_error = 0.05
+adaptive_rate_error = None
+adaptive_min_times = 10
+adaptive_filename = 'adaptive.json'
+
 
 algorithms = ['flooding', 'bft', 'mst', 'bftmst',
               'hop', 'gthop', 'far', 'area']
@@ -162,6 +259,11 @@ pd_convergence = 'convergence'
 pd_convergence_frame = 'convergenceframe'
 pd_success = 'success'
 pd_simulated_times = 'times'
+pd_path = 'path'
+pd_mtime = 'mtime'
+
+# cache of total.total_index, rows of parsed whole.json with its mtime
+total_index_filename = 'total_index.pkl'
 
 plt_markers = ['o', '*', 'p', 'h', '^', 'v', 'D', 'x']
 (plt_flooding_marker, plt_bft_marker, plt_mst_marker, plt_bftmst_marker,
@@ -1,25 +1,141 @@
 from __future__ import annotations
 from typing import NewType, List, Tuple, Dict, Union
 
+import numpy as np
 
 from dgas import rc, node, message
 
 
+class EventLog:
+    '''
+    message events of a node as integer columns (frame, from index, to index, payload id),
+    grown by doubling. nodes are indices of the registry (node index of graph's MessageTable),
+    and payloads are interned in the log.
+    '''
+
+    def __init__(self, registry: message.MessageTable, capacity: int = 8):
+        self.registry = registry
+        self.columns = np.zeros((capacity, 4), dtype=np.int64)
+        self.size = 0
+        self.payloads: List[rc.MessageType] = []
+        self.payload_index: Dict[rc.MessageType, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _payload(self, msg: rc.MessageType) -> int:
+        try:
+            i = self.payload_index.get(msg)
+        except TypeError:   # unhashable payload is not interned
+            i = None
+        if i is None:
+            i = len(self.payloads)
+            self.payloads.append(msg)
+            try:
+                self.payload_index[msg] = i
+            except TypeError:
+                pass
+        return i
+
+    def append(self, frame: rc.GlobalTime, from_node: node.Node, to_node: node.Node,
+               msg: rc.MessageType):
+        if self.size == len(self.columns):
+            self.columns = np.concatenate((self.columns, np.zeros_like(self.columns)))
+        self.columns[self.size] = (frame, self.registry.index(from_node),
+                                   self.registry.index(to_node), self._payload(msg))
+        self.size += 1
+
+    @property
+    def frame(self) -> np.ndarray:
+        return self.columns[:self.size, 0]
+
+    def records(self, sended: bool) -> List[MessageRecord]:
+        '''
+        events as MessageRecord, whose opposite is to node if sended else from node.
+        '''
+        nodes, opposite = self.registry.nodes, 2 if sended else 1
+        return [MessageRecord(frame, nodes[row[opposite]], self.payloads[row[3]])
+                for frame, row in zip(self.frame.tolist(), self.columns[:self.size].tolist())]
+
+
 class NodeRecord:
-    def __init__(self, identifier: rc.NodeID):
+    '''
+    events are kept by level (default: rc.node_log_level). counts and the last received frame
+    are always kept (enough for whole results), frames of first events from level first, and all events
+    in EventLog only at level full, from which sended_message and received_message are made.
+    '''
+
+    def __init__(self, identifier: rc.NodeID, registry: message.MessageTable = None,
+                 level: str = None):
         self.identifier = identifier
         self.frame = 0
-        self.sended_message: List[MessageRecord] = []
-        self.received_message: List[MessageRecord] = []
+        self.level = level or rc.node_log_level
+        self.registry = message.MessageTable() if registry is None else registry
+        self.clear()
+
+    def clear(self):
+        '''
+        forget all events.
+        '''
+        self.sended_count = 0
+        self.received_count = 0
+        self.first_sended_frame = -1
+        self.first_received_frame = -1
+        self.last_received_frame = -1
+        if self.level == rc.node_log_full:
+            self.sended_log, self.received_log = EventLog(self.registry), EventLog(self.registry)
+        else:
+            self.sended_log = self.received_log = None
+
+    @property
+    def sended_message(self) -> List[MessageRecord]:
+        return self.sended_log.records(sended=True) if self.sended_log is not None else []
+
+    @property
+    def received_message(self) -> List[MessageRecord]:
+        return self.received_log.records(sended=False) if self.received_log is not None else []
+
+    def log_sended(self, from_node: node.Node, to_node: node.Node, msg: rc.MessageType,
+                   frame: rc.GlobalTime = None):
+        frame = self.frame if frame is None else frame
+        self.sended_count += 1
+        if self.level == rc.node_log_count:
+            return
+        if self.first_sended_frame < 0:
+            self.first_sended_frame = frame
+        if self.sended_log is not None:
+            self.sended_log.append(frame, from_node, to_node, msg)
+
+    def log_received(self, from_node: node.Node, to_node: node.Node, msg: rc.MessageType,
+                     frame: rc.GlobalTime = None):
+        frame = self.frame if frame is None else frame
+        self.received_count += 1
+        self.last_received_frame = max(self.last_received_frame, frame)
+        if self.level == rc.node_log_count:
+            return
+        if self.first_received_frame < 0:
+            self.first_received_frame = frame
+        if self.received_log is not None:
+            self.received_log.append(frame, from_node, to_node, msg)
 
     def to_dict(self) -> Dict[str, Any]:
-        return {rc.key_node_id_log: self.identifier,
-                rc.key_node_frame_log: self.frame,
-                rc.key_node_sended_log: [msglog.to_sended_dict() for msglog in self.sended_message],
-                rc.key_node_received_log: [msglog.to_received_dict() for msglog in self.received_message]}
+        d = {rc.key_node_id_log: self.identifier,
+             rc.key_node_frame_log: self.frame,
+             rc.key_node_sended_count_log: self.sended_count,
+             rc.key_node_received_count_log: self.received_count,
+             rc.key_node_last_received_log: self.last_received_frame}
+        if self.level != rc.node_log_count:
+            d.update({rc.key_node_first_sended_log: self.first_sended_frame,
+                      rc.key_node_first_received_log: self.first_received_frame})
+        if self.level == rc.node_log_full:
+            d.update({rc.key_node_sended_log: [msglog.to_sended_dict() for msglog in self.sended_message],
+                      rc.key_node_received_log: [msglog.to_received_dict() for msglog in self.received_message]})
+        return d
 
 
 class MessageRecord:
+    __slots__ = ('frame', 'opposite', 'msg')
+
     def __init__(self, frame: rc.GlobalTime, opposite: node.Node, msg: rc.MessageType):
         self.frame = frame
         self.opposite = opposite
@@ -57,6 +173,7 @@ class FieldRecord:
     def __init__(self):
         self.pos: List[List[List[float]]] = []
         self.connectivity: List[bool] = []
+        self.connected = True   # connectivity of all frames, also kept when frames are streamed
         self.first_edges = 0
         self.added_edges = 0
         self.removed_edges = 0
@@ -0,0 +1,121 @@
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, List
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+from dgas import rc
+
+
+def filename(name: str, compress: bool = None) -> str:
+    '''
+    name of json lines file, with .gz if compress (default: rc.result_compress).
+    '''
+    compress = rc.result_compress if compress is None else compress
+    return name + '.ndjson' + ('.gz' if compress else '')
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _remove_temporary(file, path: str):
+    '''
+    finalizer of an unsaved writer, the file is closed and removed.
+    '''
+    file.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _file_mode() -> int:
+    '''
+    mode of a new file by umask, for temporary files made by mkstemp (0600).
+    '''
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def read(path: str) -> Iterator[Any]:
+    '''
+    objects of json lines file, gzipped if path ends with .gz.
+    '''
+    with _open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class NdjsonWriter:
+    '''
+    objects as json lines, buffered and written every chunk lines, gzipped if compress.
+    without path, the file is a temporary one (opened at the first flush) until save() moves it,
+    and removed when the writer is collected (or at exit) if not saved.
+    '''
+
+    def __init__(self, path: str = None, compress: bool = None, chunk: int = None):
+        self.compress = rc.result_compress if compress is None else compress
+        self.chunk = chunk or rc.result_stream_chunk
+        self.path = path
+        self.file = None
+        self.buffer: List[str] = []
+        self.lines = 0
+        self._finalizer: weakref.finalize = None
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def append(self, obj: Any):
+        self.buffer.append(json.dumps(obj, separators=(',', ':')))
+        self.lines += 1
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+    def extend(self, objs: Iterable[Any]):
+        for obj in objs:
+            self.append(obj)
+
+    def flush(self):
+        if self.file is None:
+            temporary = self.path is None
+            if temporary:
+                fd, self.path = tempfile.mkstemp(suffix=filename('', self.compress))
+                os.close(fd)
+            self.file = _open(self.path, 'w')
+            if temporary:
+                self._finalizer = weakref.finalize(self, _remove_temporary, self.file, self.path)
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer.clear()
+
+    def close(self):
+        if self.file is not None and self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def save(self, path: str):
+        '''
+        close and move to path (writing ends).
+        '''
+        self.close()
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        shutil.move(self.path, path)
+        if self._finalizer is not None:
+            os.chmod(path, _file_mode())
+        self.path = path
+
+    def discard(self):
+        '''
+        close and remove the file (writing ends).
+        '''
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
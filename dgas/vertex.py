@@ -0,0 +1,68 @@
+from __future__ import annotations
+from typing import List, Sequence
+
+import torch
+
+from dgas import rc, node, daemon
+from dgas.manet import field
+
+
+def propagate(edge_index: torch.Tensor, active: torch.Tensor, n: int) -> torch.Tensor:
+    """
+    masked sparse adjacency product, the number of active edges which come to each node.
+    O(E) in torch.
+
+    Arguments:
+        edge_index {torch.Tensor} -- directed edges (E*2) of source and destination index
+        active {torch.Tensor} -- mask of edges (E*1)
+        n {int} -- the number of nodes
+
+    Returns:
+        torch.Tensor -- count of each destination (n*1)
+    """
+    return torch.bincount(edge_index[active, 1], minlength=n)
+
+
+class VertexProgram:
+    '''
+    protocol of all nodes whose state is tensors indexed by collider index.
+    a frame is step() for node phase and deliver() for message phase, same as FairDaemon.
+    nodes may be empty if there are no node instances (n is given instead).
+    '''
+
+    def __init__(self, nodes: Sequence[node.Node] = (), n: int = None):
+        self.nodes: List[node.Node] = list(nodes)
+        self.n = len(self.nodes) if n is None else n
+        self.frame: rc.GlobalTime = 0
+
+    def step(self, t: rc.GlobalTime, edge_index: torch.Tensor):
+        '''
+        node phase of all nodes. edge_index is directed edges (E*2) of frame t.
+        '''
+
+    def deliver(self, t: rc.GlobalTime):
+        '''
+        message phase of all nodes, receive messages whose arrival frame is t.
+        '''
+
+    def write_back(self):
+        '''
+        copy the state into node instances for results and plots which read nodes.
+        '''
+
+
+class VertexDaemon(daemon.ManetDaemon):
+    '''
+    advance all nodes by one call of VertexProgram for each phase,
+    instead of calling update() and receive() of each node.
+    '''
+
+    def __init__(self, f: field.GravityField, program: VertexProgram):
+        super().__init__(f)
+        self.program = program
+
+    def each_loop(self, t: rc.GlobalTime):
+        self.field.update(t)
+        self.graph.frame = t
+        self.program.step(t, self.field.directed_edge_index())
+        self.program.deliver(t)
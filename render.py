@@ -0,0 +1,32 @@
+import argparse
+
+from dgas import rc
+from dgas.manet import render
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(
+        description='render animations of saved results of vague broadcast concurrently.')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='result directories, or directories under which all results are rendered '
+                        + '(only results saved with trajectory format npy)')
+    parser.add_argument('-c', '--concurrent', type=int, metavar='processes',
+                        help='the number of rendering processes (default: all cores)')
+    parser.add_argument('-k', '--skip', type=int, metavar='k', default=rc.animation_skip,
+                        help='render every k-th frame')
+    parser.add_argument('--fps', type=int, default=rc.animation_fps,
+                        help='frames per second of animation')
+    parser.add_argument('-s', '--size', nargs=2, metavar=('x', 'y'), type=float,
+                        help='field size (x, y) (default: recorded with trajectory)')
+    parser.add_argument('-e', '--edgeweight', type=int, metavar='w', default=rc.edge_weight,
+                        help='frames of message transition of the simulation')
+    return parser
+
+
+if __name__ == '__main__':
+    args = arg_parser().parse_args()
+    rc.edge_weight = args.edgeweight
+    for path in args.paths:
+        for animation in render.render_all(path, processes=args.concurrent, skip=args.skip,
+                                           fps=args.fps, extent=args.size):
+            print(animation)
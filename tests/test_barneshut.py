@@ -0,0 +1,30 @@
+import torch
+
+from dgas.manet import barneshut, physics
+
+
+def clustered(seed: int = 0) -> torch.Tensor:
+    '''
+    200 bodies in the field and a tight cluster of 50 bodies (spread 1e-3) in one leaf.
+    '''
+    generator = torch.Generator().manual_seed(seed)
+    field = torch.rand(200, 2, generator=generator, dtype=torch.float64) * 1000
+    cluster = 500 + torch.randn(50, 2, generator=generator, dtype=torch.float64) * 1e-3
+    return torch.cat((field, cluster))
+
+
+def relative_error(pos: torch.Tensor, theta: float) -> torch.Tensor:
+    laws = list(physics.mobility_laws())
+    exact = barneshut.exact_force(pos, laws)
+    approx = barneshut.force(pos, laws, theta=theta)
+    return torch.norm(approx - exact, dim=-1) / torch.norm(exact, dim=-1)
+
+
+def test_theta_zero_is_exact_on_cluster():
+    assert relative_error(clustered(), 0.0).max() < 1e-9
+
+
+def test_cluster_bodies_are_summed_exactly():
+    error = relative_error(clustered(), 0.5)
+    assert error[200:].max() < 1e-9     # dominated by bodies in the same leaf
+    assert error.median() < 0.01
@@ -0,0 +1,33 @@
+import json
+import os
+
+from dgas import rc
+from dgas.manet.algorithms.vague_broadcast import total
+
+
+def write_whole(dirpath: str, nodes: int):
+    os.makedirs(dirpath)
+    whole = {rc.key_result_delay: 5, rc.key_result_algorithm: 'flooding',
+             rc.key_result_number_of_nodes: nodes, rc.key_result_all_sended_messages: 10,
+             rc.key_result_all_sended_nodes: 3, rc.key_result_all_received_nodes: 4,
+             rc.key_result_convergence: True, rc.key_result_convergence_frame: 7,
+             rc.key_result_success: True, rc.key_result_connectivity: True}
+    with open(os.path.join(dirpath, rc.key_whole_result + '.json'), 'w') as f:
+        json.dump(whole, f)
+
+
+def test_total_index_empty_tree_twice(tmp_path):
+    for _ in range(2):
+        df = total.total_index(str(tmp_path)).df
+        assert len(df) == 0
+        assert rc.pd_nodes in df.columns
+
+
+def test_total_index_drops_removed_runs(tmp_path):
+    write_whole(str(tmp_path / 'a'), 10)
+    write_whole(str(tmp_path / 'b'), 20)
+    assert sorted(total.total_index(str(tmp_path)).df[rc.pd_nodes]) == [10, 20]
+    os.remove(tmp_path / 'b' / (rc.key_whole_result + '.json'))
+    assert list(total.total_index(str(tmp_path)).df[rc.pd_nodes]) == [10]
+    os.remove(tmp_path / 'a' / (rc.key_whole_result + '.json'))
+    assert len(total.total_index(str(tmp_path)).df) == 0
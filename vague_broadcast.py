@@ -1,14 +1,20 @@
 import argparse
+import contextlib
+import itertools
 import os
 import sys
 import datetime as dt
+import json
+import queue
 from multiprocessing import Pool
 
 from tqdm import tqdm
+import torch
 import matplotlib.pyplot as plt
 
 from dgas import rc
-from dgas.manet.algorithms.vague_broadcast import flooding, bft, mst, bftmst, hop, gthop, far, area
+from dgas.manet import trace
+from dgas.manet.algorithms.vague_broadcast import flooding, bft, mst, bftmst, hop, gthop, far, area, simulator, store, stats
 
 FLOODING = rc.algname_flooding
 FAR = rc.algname_far
@@ -32,8 +38,20 @@ def arg_parser():
                         help='list of the number of node (if set nodes, this arg is ignored)')
     parser.add_argument('-t', '--times', type=int, nargs='*', metavar='times', default=[100],
                         help='simulation times on the same number of nodes (length is 1 or same to rangelist)')
-    # parser.add_argument('-c', '--concurrent', type=int, metavar='processes',
-    #                     help='use multi processing (*developping...)')
+    parser.add_argument('-c', '--concurrent', type=int, metavar='processes',
+                        help='run simulations in a pool of processes, longest first')
+    parser.add_argument('--replay', action='store_true',
+                        help='record mobility once for each simulation and replay it by all algorithms')
+    parser.add_argument('--store', metavar='path',
+                        help='append results to a sqlite result store instead of json directories')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='stop each number of nodes when confidence intervals are narrow enough '
+                        + '(times is the max)')
+    parser.add_argument('--rate-error', type=float, metavar='e',
+                        help='with adaptive, also stop on the success rate interval within e '
+                        + '(needs at least 35 runs for 0.05, 16 for 0.1)')
+    parser.add_argument('--seed', type=int, metavar='seed',
+                        help='base seed of concurrent jobs, job k uses seed + k (default: random)')
     parser.add_argument('-a', '--animate',
                         action='store_true', help='output animation')
     parser.add_argument('-s', '--size', nargs=2, metavar=('x', 'y'), default=[rc.field_xlen, rc.field_ylen],
@@ -46,6 +64,11 @@ def arg_parser():
                         help='output path of result (and animation)')
     parser.add_argument('-d', '--delay', type=int, metavar='d',
                         default=rc.node_delay, help='the delay of message transition')
+    parser.add_argument('-v', '--vectorized', action='store_true',
+                        help='advance all nodes by tensor operations (messages are not drawn)')
+    parser.add_argument('-b', '--batch', type=int, metavar='replicas',
+                        help='advance replicas of the same number of nodes together (only whole result is saved).'
+                        + ' pays off for small n (about 150 or less), see rc.batch_max_pairs')
     return parser
 
 
@@ -87,10 +110,85 @@ def simulator_class(algorithm):
         raise ValueError(f'unexpected algorithm {algorithm}.')
 
 
-def simulator_generator(algorithm, frames, limits, field_xy, rangelist):
+def simulator_generator(algorithm, frames, limits, field_xy, rangelist, vectorized=False):
     sc = simulator_class(algorithm)
     return (sc(n, *field_xy, untiltime=frames, timeout=limits,
-               conditionend=(frames == None) and (limits == None)) for n in rangelist)
+               conditionend=(frames == None) and (limits == None),
+               vectorized=vectorized) for n in rangelist)
+
+
+def batch_simulator_generator(algorithm, frames, limits, field_xy, rangelist, batchsize):
+    sc = simulator_class(algorithm)
+    batches = batches_of(rangelist, batchsize)
+    return (simulator.BatchBroadcastSimulator(
+        sc, n, size, *field_xy, untiltime=frames, timeout=limits,
+        conditionend=(frames == None) and (limits == None)) for n, size in batches), len(batches)
+
+
+def batches_of(rangelist, batchsize):
+    '''
+    consecutive replicas of the same n, at most batchsize and rc.batch_max_pairs in total.
+    '''
+    batches = []
+    for n in rangelist:
+        size = max(1, min(batchsize, rc.batch_max_pairs // n**2))
+        if batches and batches[-1][0] == n and batches[-1][1] < size:
+            batches[-1][1] += 1
+        else:
+            batches.append([n, 1])
+    return batches
+
+
+def make_jobs(algorithm, frames, limits, field_xy, rangelist, workspace,
+              animate, vectorized, batchsize, seed, storepath=None):
+    '''
+    a job is a simulator (or a batch of replicas) with its own seed, which is decided by
+    the order of rangelist, so results don't depend on the number of processes.
+    jobs are sorted longest first by n^2 cost, for load balancing of the pool.
+    '''
+    units = batches_of(rangelist, batchsize) if batchsize else [(n, 1) for n in rangelist]
+    jobs = [(algorithm, n, size, seed + k, frames, limits, field_xy, workspace, animate, vectorized,
+             bool(batchsize), storepath) for k, (n, size) in enumerate(units)]
+    return sorted(jobs, key=lambda job: job[1]**2 * job[2], reverse=True)
+
+
+def init_worker(delay, animate):
+    torch.set_num_threads(1)    # processes are parallel, so intra-op threads oversubscribe
+    rc.node_delay = delay
+    rc.bft_edge_color = rc.mst_edge_color = rc.bftmst_edge_color = None
+    rc.headless = not animate
+
+
+def run_job(job):
+    '''
+    return saved directories (or run ids of store) and whole results of them.
+    '''
+    (algorithm, n, size, seed, frames, limits, field_xy, workspace, animate, vectorized,
+     batch, storepath) = job
+    torch.manual_seed(seed)
+    conditionend = (frames == None) and (limits == None)
+    results = store.ResultStore(storepath) if storepath else None
+    if batch:
+        sim = simulator.BatchBroadcastSimulator(simulator_class(algorithm), n, size, *field_xy,
+                                                untiltime=frames, timeout=limits,
+                                                conditionend=conditionend)
+        outdirs = sim.run_and_save(workspace, mkdir=True, connectedonly=True, store=results)
+        wholes = [whole for whole in sim.results if whole[rc.key_result_connectivity]]
+    else:
+        sim = simulator_class(algorithm)(n, *field_xy, untiltime=frames, timeout=limits,
+                                         conditionend=conditionend, vectorized=vectorized)
+        outdir = sim.run_and_save(workspace, ani=animate, mkdir=True, connectedonly=True,
+                                  store=results)
+        outdirs, wholes = ([], []) if outdir is None else ([outdir], [sim.whole_result_dict()])
+        if animate:
+            plt.close()
+    if results:
+        results.close()
+    return outdirs, wholes
+
+
+def open_store(storepath):
+    return store.ResultStore(storepath) if storepath else contextlib.nullcontext()
 
 
 def make_workspace(out, delay, algorithm):
@@ -110,32 +208,182 @@ def print_end(algorithm, rangelist, outdir):
 
 
 def simulation(algorithm, nodes, nodeslist, times, delay, out, field_xy,
-               animate, printprogress=True):
+               animate, printprogress=True, vectorized=False, batchsize=None,
+               concurrent=None, seed=None, storepath=None):
+    if animate and batchsize:
+        raise ValueError('batch simulation cannot output animation.')
     rc.node_delay = delay
     rc.bft_edge_color = rc.mst_edge_color = rc.bftmst_edge_color = None
+    rc.headless = not animate
     rangelist = list(range_generator(nodes, nodeslist, times))
     workspace = make_workspace(out, delay, algorithm)
-    simulators = simulator_generator(algorithm, frames, limits,
-                                     field_xy, rangelist)
     results = []
     if printprogress:
         print_start(algorithm, nodes, nodeslist, times)
-    for simulator in tqdm(simulators, total=len(rangelist)):
-        outdir = simulator.run_and_save(workspace, ani=animate,
-                                        mkdir=True, connectedonly=True)
-        if outdir:
-            results.append(outdir)
-        if animate:
-            plt.close()
+    if concurrent:
+        seed = torch.initial_seed() % 2**32 if seed is None else seed
+        if printprogress:
+            print(f'{concurrent} processes, seed {seed}.')
+        jobs = make_jobs(algorithm, frames, limits, field_xy, rangelist, workspace,
+                         animate, vectorized, batchsize, seed, storepath)
+        with Pool(concurrent, initializer=init_worker, initargs=(delay, animate)) as pool:
+            for outdirs, _wholes in tqdm(pool.imap_unordered(run_job, jobs), total=len(jobs)):
+                results += outdirs
+    elif batchsize:
+        simulators, total = batch_simulator_generator(algorithm, frames, limits,
+                                                      field_xy, rangelist, batchsize)
+        with open_store(storepath) as results_store:
+            for sim in tqdm(simulators, total=total):
+                results += sim.run_and_save(workspace, mkdir=True, connectedonly=True,
+                                            store=results_store)
+    else:
+        simulators = simulator_generator(algorithm, frames, limits,
+                                         field_xy, rangelist, vectorized)
+        with open_store(storepath) as results_store:
+            for sim in tqdm(simulators, total=len(rangelist)):
+                outdir = sim.run_and_save(workspace, ani=animate,
+                                          mkdir=True, connectedonly=True, store=results_store)
+                if outdir is not None:
+                    results.append(outdir)
+                if animate:
+                    plt.close()
     if printprogress:
         print_end(algorithm, rangelist, results)
 
 
+def replay_simulation(algorithms, nodes, nodeslist, times, delay, out, field_xy,
+                      printprogress=True, vectorized=False, storepath=None):
+    '''
+    all algorithms are simulated on the same fields, mobility of each field is recorded once
+    (for limits or frames, or rc.trace_frames) and replayed by each algorithm.
+    '''
+    rc.node_delay = delay
+    rc.bft_edge_color = rc.mst_edge_color = rc.bftmst_edge_color = None
+    rc.headless = True
+    rangelist = list(range_generator(nodes, nodeslist, times))
+    workspaces = {alg: make_workspace(out, delay, alg) for alg in algorithms}
+    results = {alg: [] for alg in algorithms}
+    if printprogress:
+        print_start(', '.join(algorithms), nodes, nodeslist, times)
+    with open_store(storepath) as results_store:
+        for n in tqdm(rangelist):
+            mobility = trace.record(n, *field_xy, limits or frames)
+            for alg in algorithms:
+                sim = simulator_class(alg)(n, *field_xy, untiltime=frames, timeout=limits,
+                                           conditionend=(frames == None) and (limits == None),
+                                           vectorized=vectorized, replay=mobility)
+                outdir = sim.run_and_save(workspaces[alg], mkdir=True, connectedonly=True,
+                                          store=results_store)
+                if outdir is not None:
+                    results[alg].append(outdir)
+    if printprogress:
+        for alg in algorithms:
+            print_end(alg, rangelist, results[alg])
+
+
+def adaptive_simulation(algorithm, nodes, nodeslist, times, delay, out, field_xy,
+                        printprogress=True, vectorized=False, concurrent=None, seed=None,
+                        storepath=None):
+    '''
+    replicas of each number of nodes are run until its CellStats is done or times runs,
+    and the next replica is of the cell whose interval is the widest.
+    with concurrent, a job is submitted when one finishes, so results fold in as they complete.
+    replica k of a number of nodes always has the same seed (offset of the cell + k),
+    so the seeds don't depend on the order of completion.
+    '''
+    rc.node_delay = delay
+    rc.bft_edge_color = rc.mst_edge_color = rc.bftmst_edge_color = None
+    rc.headless = True
+    rangelist = [nodes] if nodes else nodeslist
+    maxtimes = dict(zip(rangelist, times if len(times) == len(rangelist) else times * len(rangelist)))
+    workspace = make_workspace(out, delay, algorithm)
+    seed = torch.initial_seed() % 2**32 if seed is None else seed
+    cells = {n: stats.CellStats() for n in rangelist}
+    offsets = dict(zip(rangelist, itertools.accumulate([0] + [maxtimes[n] for n in rangelist])))
+    submitted, pending = {n: 0 for n in rangelist}, {n: 0 for n in rangelist}
+    results = []
+    if printprogress:
+        print_start(algorithm, nodes, nodeslist, times)
+        print(f'adaptive, seed {seed}.')
+        if rc.adaptive_rate_error is not None and min(maxtimes.values()) < stats.rate_min_times():
+            print(f'rate error {rc.adaptive_rate_error} needs {stats.rate_min_times()} times at least,'
+                  + ' cells with fewer times never stop early.')
+    progress = tqdm(total=sum(maxtimes.values()))
+
+    def next_job():
+        active = [n for n in rangelist if submitted[n] < maxtimes[n] and not cells[n].done()]
+        if not active:
+            return None
+        n = min(active, key=lambda n: (cells[n].n + pending[n] >= rc.adaptive_min_times,
+                                       -cells[n].error(), pending[n]))
+        job = (algorithm, n, 1, seed + offsets[n] + submitted[n], frames, limits, field_xy,
+               workspace, False, vectorized, False, storepath)
+        submitted[n] += 1
+        pending[n] += 1
+        return job
+
+    def fold(job, outdirs, wholes):
+        n = job[1]
+        pending[n] -= 1
+        results.extend(outdirs)
+        for whole in wholes:
+            cells[n].add(whole)
+        progress.update()
+
+    if concurrent:
+        finished = queue.Queue()
+        with Pool(concurrent, initializer=init_worker, initargs=(delay, False)) as pool:
+            def launch():
+                job = next_job()
+                if job is None:
+                    return 0
+                pool.apply_async(run_job, (job,), callback=lambda r, job=job: finished.put((job, r)),
+                                 error_callback=lambda e: finished.put((None, e)))
+                return 1
+            running = sum(launch() for _ in range(concurrent))
+            while running:
+                job, returned = finished.get()
+                if job is None:
+                    raise returned
+                fold(job, *returned)
+                running += launch() - 1
+    else:
+        job = next_job()
+        while job is not None:
+            fold(job, *run_job(job))
+            job = next_job()
+    progress.close()
+    summary = [dict(cells[n].to_dict(), **{rc.key_result_number_of_nodes: n}) for n in rangelist]
+    with open(os.path.join(workspace, rc.adaptive_filename), 'w') as f:
+        json.dump(summary, f, indent=4)
+    if printprogress:
+        for cell in summary:
+            print(cell)
+        print(f'finish {algorithm} simulation in {sum(submitted.values())} times.'
+              + f' saved {len(results)} directories.')
+
+
 if __name__ == '__main__':
     args = arg_parser().parse_args()
     algorithms, nodes, nodeslist = args.algorithms, args.nodes, args.rangelist
     times, animate, field_xy = args.times, args.animate, args.size
     frames, limits, out, delay = args.frames, args.limits, args.out, args.delay
-    for alg in algorithms:
-        simulation(alg, nodes, nodeslist, times, delay, out, field_xy,
-                   animate, printprogress=True)
+    if args.replay:
+        if animate or args.batch or args.concurrent:
+            raise ValueError('replay cannot be used with animate, batch and concurrent.')
+        replay_simulation(algorithms, nodes, nodeslist, times, delay, out, field_xy,
+                          printprogress=True, vectorized=args.vectorized, storepath=args.store)
+    elif args.adaptive:
+        if animate or args.batch:
+            raise ValueError('adaptive cannot be used with animate and batch.')
+        rc.adaptive_rate_error = args.rate_error
+        for alg in algorithms:
+            adaptive_simulation(alg, nodes, nodeslist, times, delay, out, field_xy,
+                                printprogress=True, vectorized=args.vectorized,
+                                concurrent=args.concurrent, seed=args.seed, storepath=args.store)
+    else:
+        for alg in algorithms:
+            simulation(alg, nodes, nodeslist, times, delay, out, field_xy,
+                       animate, printprogress=True, vectorized=args.vectorized,
+                       batchsize=args.batch, concurrent=args.concurrent, seed=args.seed,
+                       storepath=args.store)